@@ -1,39 +1,36 @@
 import os
 import traceback
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
 import dotenv
 import requests
 import zipfile
-from azure.core.exceptions import ResourceNotFoundError
 import time
+from retrieve_binance.storage import get_storage
+from retrieve_binance.storage_format import STORAGE_FORMAT, convert_csv_file, with_format_extension, legacy_csv_path
 
 dotenv.load_dotenv()
-ACCOUNT_KEY = os.environ['AZURE_STORAGE_ACCOUNT_KEY']
-ACCOUNT_URL = os.environ['AZURE_STORAGE_ACCOUNT_URL']
-
-BLOB_CLIENT = BlobServiceClient(account_url=ACCOUNT_URL, credential=ACCOUNT_KEY)
 
 SYMBOLS = [ 'LRCUSDT','BTCUSDT','ZECUSDT','EOSUSDT','SOLUSDT','XEMUSDT','OPUSDT','SNXUSDT','1INCHUSDT','TRXUSDT','QTUMUSDT','AGIXUSDT','RUNEUSDT','FLOWUSDT','BNBUSDT','HFTUSDT','APTUSDT','ANKRUSDT','DOGEUSDT','ASTRUSDT','RDNTUSDT','STXUSDT','CTKUSDT','ETHUSDT','NEARUSDT','TUSDT','IOTXUSDT','GRTUSDT','UNIUSDT','ZRXUSDT','DYDXUSDT','ICPUSDT','NEOUSDT','BNXUSDT','SANDUSDT','EGLDUSDT','SSVUSDT','GTCUSDT','MASKUSDT','AMBUSDT','DARUSDT','CELOUSDT','AAVEUSDT','HBARUSDT','ARBUSDT','SXPUSDT','ANTUSDT','ZENUSDT','ICXUSDT','XTZUSDT','YFIUSDT','RSRUSDT','PEOPLEUSDT','DGBUSDT','LINKUSDT','GALUSDT','FTMUSDT','FXSUSDT','TLMUSDT','CELRUSDT','SUSHIUSDT','ALPHAUSDT','ARPAUSDT','HOOKUSDT','MINAUSDT','COTIUSDT','JOEUSDT','ENSUSDT','WOOUSDT','INJUSDT','SKLUSDT','USDCUSDT','IMXUSDT','SFPUSDT','DASHUSDT','MAGICUSDT','PERPUSDT','CTSIUSDT','CHZUSDT','QNTUSDT','LEVERUSDT','IOTAUSDT','IOSTUSDT','WAVESUSDT','TOMOUSDT','BLZUSDT','C98USDT','VETUSDT','ZILUSDT','GMTUSDT','DOTUSDT','ROSEUSDT','LDOUSDT','XLMUSDT','CFXUSDT','LITUSDT','XVSUSDT','OCEANUSDT','BANDUSDT','HOTUSDT','LTCUSDT','AVAXUSDT','ENJUSDT','GALAUSDT','BATUSDT','FETUSDT','BALUSDT','FILUSDT','KAVAUSDT','RNDRUSDT','LPTUSDT','AUDIOUSDT','ALGOUSDT','XRPUSDT','OGNUSDT','GMXUSDT','ACHUSDT','ONTUSDT','KLAYUSDT','REEFUSDT','AXSUSDT','HIGHUSDT','LINAUSDT','ALICEUSDT','DUSKUSDT','FLMUSDT','PHBUSDT','ATOMUSDT','MATICUSDT','LQTYUSDT','STORJUSDT','CKBUSDT','KNCUSDT','MKRUSDT','APEUSDT','API3USDT','NKNUSDT','RVNUSDT','CHRUSDT','MANAUSDT','CRVUSDT','STMXUSDT','ADAUSDT','ATAUSDT','STGUSDT','ARUSDT','IDUSDT','RLCUSDT','THETAUSDT','BLURUSDT','ONEUSDT','TRUUSDT','TRBUSDT','COMPUSDT','IDEXUSDT','SUIUSDT','EDUUSDT','MTLUSDT','1000PEPEUSDT','1000FLOKIUSDT','DENTUSDT','BCHUSDT','1000XECUSDT','JASMYUSDT','UMAUSDT','BELUSDT','1000SHIBUSDT','RADUSDT','XMRUSDT','1000LUNCUSDT','SPELLUSDT','KEYUSDT','COMBOUSDT','UNFIUSDT','CVXUSDT','ETCUSDT','MAVUSDT','MDTUSDT','XVGUSDT','NMRUSDT','BAKEUSDT','WLDUSDT','PENDLEUSDT','ARKMUSDT','AGLDUSDT','YGGUSDT','SEIUSDT' ]
 
 
 def does_blob_exist(container_file_path):
-    blob_client = BlobClient(account_url=ACCOUNT_URL, container_name="binancedata", blob_name=container_file_path, credential=ACCOUNT_KEY)
-
-    # Try to get blob properties
-    try:
-        blob_client.get_blob_properties()
-        return True
-    except ResourceNotFoundError:
-        return False
+    return get_storage().exists(container_file_path)
 
 
 
 def upload_to_blob(local_file_path, container_file_path):
     try:
-        blob_containter = BLOB_CLIENT.get_blob_client(container="binancedata", blob=container_file_path)
-
-        with open(local_file_path, 'rb') as data:
-            blob_containter.upload_blob(data, overwrite=True)
+        if STORAGE_FORMAT == "csv":
+            with open(local_file_path, 'rb') as data:
+                get_storage().put(container_file_path, data)
+        else:
+            # Converts the raw Binance CSV so the column types are stored with it,
+            # a block at a time as a month of trades can be larger than memory
+            converted_file_path = convert_csv_file(local_file_path)
+            try:
+                with open(converted_file_path, 'rb') as data:
+                    get_storage().put(container_file_path, data)
+            finally:
+                os.remove(converted_file_path)
 
         print("File uploaded successfully!")
 
@@ -94,9 +91,9 @@ def retrieve_agg_trades(symbol, date, interval="monthly"):
     data_type = "aggTrades"
 
     local_file_path = f"local/{symbol}-{data_type}-{date}.csv"
-    container_file_path = f"{data_type}/{interval}/{symbol}/{symbol}-{data_type}-{date}.csv"
+    container_file_path = with_format_extension(f"{data_type}/{interval}/{symbol}/{symbol}-{data_type}-{date}.csv")
 
-    if does_blob_exist(container_file_path):
+    if does_blob_exist(container_file_path) or does_blob_exist(legacy_csv_path(container_file_path)):
         return
 
     # Downloading data
@@ -0,0 +1,56 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from retrieve_binance.reduce_trades import reduce_trades, REDUCE_ENGINES
+
+# Times each reduce engine on a synthetic month of agg trades
+# Usage: python -m retrieve_binance.benchmark_reduce [num_rows]
+
+
+def synthetic_agg_trades(num_rows, date="2023-09", seed=0):
+    rng = np.random.default_rng(seed)
+
+    month_start = pd.Timestamp(f"{date}-01")
+    month_end = month_start + pd.offsets.MonthBegin(1)
+    start_ms = month_start.value // 1_000_000
+    end_ms = month_end.value // 1_000_000
+
+    first_trade_id = np.arange(num_rows) * 3
+
+    return pd.DataFrame({
+        "price": np.round(26000 + rng.normal(0, 50, num_rows), 1),
+        "quantity": np.round(rng.exponential(0.05, num_rows), 3),
+        "first_trade_id": first_trade_id,
+        "last_trade_id": first_trade_id + rng.integers(0, 3, num_rows),
+        "transact_time": np.sort(rng.integers(start_ms, end_ms, num_rows)),
+        "is_buyer_maker": rng.random(num_rows) > 0.5,
+    }, index=pd.RangeIndex(num_rows, name="agg_trade_id"))
+
+
+def benchmark(num_rows=20_000_000, date="2023-09"):
+    print(f"> Building {num_rows} synthetic agg trades for {date}...")
+    agg_trades_df = synthetic_agg_trades(num_rows, date)
+
+    results = {}
+    timings = {}
+
+    for engine in REDUCE_ENGINES:
+        start = time.perf_counter()
+        # The pandas reducer adds columns to its input
+        results[engine] = reduce_trades(agg_trades_df.copy(), date, engine=engine)
+        timings[engine] = time.perf_counter() - start
+
+    reference = results["pandas"]
+
+    for engine in REDUCE_ENGINES:
+        reduced_df = results[engine]
+        matches = reduced_df.index.equals(reference.index) and reduced_df.equals(reference.astype(reduced_df.dtypes))
+        speedup = timings["pandas"] / timings[engine]
+        print(f"> {engine:<9} {timings[engine]:8.2f}s  {speedup:6.1f}x  identical to pandas: {matches}")
+
+    return timings
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000_000)
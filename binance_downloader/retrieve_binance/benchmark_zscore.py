@@ -0,0 +1,58 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from retrieve_binance.feature_engine import rolling_zscore, rolling_zscores
+
+# Checks the fused z-score kernel against the pandas version and times both
+# on a synthetic month of 1s reduced trades
+# Usage: python -m retrieve_binance.benchmark_zscore [num_rows]
+
+ZSCORE_COLUMNS = [
+    "sum_asset_bought",
+    "num_of_trades_bought",
+    "sum_asset_sold",
+    "num_of_trades_sold",
+]
+
+
+def synthetic_reduced_trades(num_rows, date="2023-09", seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(f"{date}-01", periods=num_rows, freq="1s")
+
+    # Mostly quiet seconds with bursts of trades, and whole quiet hours
+    traded = rng.random(num_rows) < 0.05
+    traded[(np.arange(num_rows) // 7200) % 5 == 0] = False
+
+    reduced_trades_df = pd.DataFrame(index=index)
+    for column in ZSCORE_COLUMNS:
+        if column.startswith("num_of_trades"):
+            reduced_trades_df[column] = np.where(traded, rng.poisson(3, num_rows), 0).astype(float)
+        else:
+            reduced_trades_df[column] = np.where(traded, np.round(rng.exponential(5, num_rows), 2), 0.0)
+
+    return reduced_trades_df
+
+
+def benchmark(num_rows=2_592_000, date="2023-09"):
+    print(f"> Building {num_rows} synthetic reduced trades for {date}...")
+    reduced_trades_df = synthetic_reduced_trades(num_rows, date)
+
+    start = time.perf_counter()
+    expected = np.column_stack([round(rolling_zscore(reduced_trades_df[column]), 2).to_numpy() for column in ZSCORE_COLUMNS])
+    pandas_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fused = np.round(rolling_zscores(reduced_trades_df[ZSCORE_COLUMNS].to_numpy(), reduced_trades_df.index), 2)
+    fused_time = time.perf_counter() - start
+
+    mismatches = int((~((fused == expected) | (np.isnan(fused) & np.isnan(expected)))).sum())
+
+    print(f"> pandas {pandas_time:8.2f}s")
+    print(f"> fused  {fused_time:8.2f}s  {pandas_time / fused_time:6.1f}x  mismatches: {mismatches}")
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2_592_000)
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+from retrieve_binance.storage import Storage, STREAM_CHUNK_SIZE
+
+load_dotenv()
+
+LOCAL_LOCATION = os.getenv("LOCAL_LOCATION")
+if LOCAL_LOCATION == None:
+    raise Exception("> blob_cache: LOCAL_LOCATION not set. Please make .env file with LOCAL_LOCATION filepath")
+
+# Max size of the cache on disk before least recently used blobs are evicted
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", 20 * 1024 ** 3))
+# Seconds a cached blob is trusted before its ETag is checked against the store again
+BLOB_CACHE_TTL = int(os.getenv("BLOB_CACHE_TTL", 60 * 60))
+
+
+class BlobCache():
+    # Read-through cache of blob contents, shared by every process using the
+    # same cache_location. Blobs are stored by content hash under objects/ and
+    # each blob path has its own small entry file under entries/ with its ETag
+    # and content hash, so processes writing different blobs don't overwrite
+    # each other's entries. Objects are evicted least recently read first,
+    # their mtime is touched on every read.
+
+    def __init__(self, cache_location=f"{LOCAL_LOCATION}/blob_cache", max_bytes=BLOB_CACHE_MAX_BYTES, ttl=BLOB_CACHE_TTL):
+        self.cache_location = cache_location
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        os.makedirs(f"{cache_location}/objects", exist_ok=True)
+        os.makedirs(f"{cache_location}/entries", exist_ok=True)
+
+        # Replaced by the entry files, its objects are evicted like any other
+        if os.path.exists(f"{cache_location}/index.json"):
+            os.remove(f"{cache_location}/index.json")
+
+
+    def read(self, storage, blob_path):
+        entry = self.__load_entry(blob_path)
+
+        if entry is not None:
+            if time.time() - entry["validated_at"] < self.ttl:
+                data = self.__read_object(entry["content_hash"])
+                if data is not None:
+                    print(f"> Cache hit for {blob_path}")
+                    return data
+
+            # Raises StorageNotFoundError like a download would
+            elif storage.version(blob_path) == entry["etag"]:
+                data = self.__read_object(entry["content_hash"])
+                if data is not None:
+                    print(f"> Cache revalidated for {blob_path}")
+                    entry["validated_at"] = time.time()
+                    self.__save_entry(blob_path, entry)
+                    return data
+
+        print(f"> Cache miss for {blob_path}")
+        # Version is taken first so a concurrent overwrite is caught on the next revalidation
+        etag = storage.version(blob_path)
+        data = storage.get(blob_path)
+        self.put(blob_path, data, etag)
+
+        return data
+
+
+    def version(self, blob_path):
+        # The cached ETag of blob_path if it was validated within the TTL, else None
+        entry = self.__load_entry(blob_path)
+
+        if entry is None or time.time() - entry["validated_at"] >= self.ttl:
+            return None
+        if not os.path.exists(self.__object_path(entry["content_hash"])):
+            return None
+
+        return entry["etag"]
+
+
+    def put(self, blob_path, data, etag):
+        content_hash = hashlib.sha256(data).hexdigest()
+        object_path = self.__object_path(content_hash)
+
+        if os.path.exists(object_path):
+            os.utime(object_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            tmp_path = f"{object_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, object_path)
+
+        self.__save_entry(blob_path, {
+            "blob_path": blob_path,
+            "etag": etag,
+            "content_hash": content_hash,
+            "size": len(data),
+            "validated_at": time.time(),
+        })
+
+        self.__evict()
+
+
+    def invalidate(self, blob_path):
+        # The object is left for eviction, other blob paths may have the same contents
+        try:
+            os.remove(self.__entry_path(blob_path))
+        except FileNotFoundError:
+            pass
+
+
+    def __read_object(self, content_hash):
+        # None if it's been evicted, maybe by another process
+        object_path = self.__object_path(content_hash)
+        try:
+            with open(object_path, "rb") as f:
+                data = f.read()
+            os.utime(object_path)
+        except FileNotFoundError:
+            return None
+
+        return data
+
+
+    def __evict(self):
+        # Walks objects/ rather than the entries, so objects no entry points
+        # to any more count towards max_bytes and are evicted too
+        objects = []
+        for directory in os.scandir(f"{self.cache_location}/objects"):
+            if not directory.is_dir():
+                continue
+
+            for object_file in os.scandir(directory.path):
+                if object_file.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = object_file.stat()
+                except FileNotFoundError:
+                    continue
+                objects.append((stat.st_mtime, stat.st_size, object_file.path))
+
+        total_bytes = sum(size for _, size, _ in objects)
+
+        for _, size, object_path in sorted(objects):
+            if total_bytes <= self.max_bytes:
+                break
+
+            print(f"> Evicting {os.path.basename(object_path)} from cache")
+            try:
+                os.remove(object_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+    def __object_path(self, content_hash):
+        return f"{self.cache_location}/objects/{content_hash[:2]}/{content_hash}"
+
+
+    def __entry_path(self, blob_path):
+        return f"{self.cache_location}/entries/{hashlib.sha256(blob_path.encode('utf-8')).hexdigest()}.json"
+
+
+    def __load_entry(self, blob_path):
+        try:
+            with open(self.__entry_path(blob_path), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+    def __save_entry(self, blob_path, entry):
+        entry_path = self.__entry_path(blob_path)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+
+
+class CachedStorage(Storage):
+    # Storage wrapper that serves reads from a BlobCache and writes through it
+
+    def __init__(self, storage, cache=None):
+        self.storage = storage
+        self.cache = cache if cache is not None else BlobCache()
+
+
+    def get(self, path):
+        return self.cache.read(self.storage, path)
+
+
+    def put(self, path, data):
+        version = self.storage.put(path, data)
+
+        if isinstance(data, (bytes, bytearray)):
+            self.cache.put(path, data, version)
+        else:
+            # Large file uploads aren't worth caching, just drop the stale entry
+            self.cache.invalidate(path)
+
+        return version
+
+
+    def exists(self, path):
+        # A blob validated within the TTL is taken to still be there
+        if self.cache.version(path) is not None:
+            return True
+        return self.storage.exists(path)
+
+
+    def list(self, prefix=""):
+        return self.storage.list(prefix)
+
+
+    def stream(self, path, chunk_size=STREAM_CHUNK_SIZE):
+        return self.storage.stream(path, chunk_size=chunk_size)
+
+
+    def get_range(self, path, offset, length):
+        # Ranges go straight to the store, only whole blobs are cached
+        return self.storage.get_range(path, offset, length)
+
+
+    def size(self, path):
+        return self.storage.size(path)
+
+
+    def version(self, path):
+        version = self.cache.version(path)
+        if version is not None:
+            return version
+        return self.storage.version(path)
+
+
+    def local_path(self, path):
+        return self.storage.local_path(path)
+
+
+    def delete(self, path):
+        self.storage.delete(path)
+        self.cache.invalidate(path)
@@ -0,0 +1,365 @@
+import numpy as np
+import pandas as pd
+from retrieve_binance.news_store import NEWS_RESOLVER_VERSION
+
+# Feature types build their columns from the config, e.g.
+# {"type": "moving_average", "columns": ["sum_asset_sold_zscore"], "periods": [5]}
+# Each column is a FeatureNode naming the columns it reads, so features can be
+# listed in any order and shared inputs are only computed once.
+FEATURE_TYPES = {}
+
+
+def register_feature(feature_type):
+    def register(build_nodes):
+        FEATURE_TYPES[feature_type] = build_nodes
+        return build_nodes
+    return register
+
+
+class FeatureNode():
+
+    def __init__(self, column, spec, inputs, kernel, store_column=None):
+        self.column = column
+        # Identifies how the column is computed, used as the feature store key
+        self.spec = spec
+        self.inputs = inputs
+        # kernel(df, dataset) returns the column values aligned with df
+        self.kernel = kernel
+        # Name the column is stored under, so differently named copies share one blob
+        self.store_column = store_column or column
+
+
+    def compute(self, df, dataset=None):
+        return self.kernel(df, dataset)
+
+
+class FeatureGraph():
+
+    def __init__(self, features):
+        self.nodes = {}
+
+        for feature in features:
+            feature_type = feature["type"]
+            if feature_type not in FEATURE_TYPES:
+                raise Exception(f"Unknown feature type {feature_type}")
+
+            for node in FEATURE_TYPES[feature_type](feature):
+                if node.column in self.nodes and self.nodes[node.column].spec != node.spec:
+                    raise Exception(f"Feature column {node.column} is declared twice with different specs")
+                self.nodes[node.column] = node
+
+
+    @property
+    def columns(self):
+        return list(self.nodes)
+
+
+    def ordered_nodes(self, available_columns):
+        # Depth first so every node comes after the nodes it reads from
+        available_columns = set(available_columns)
+        ordered, visited, visiting = [], set(), set()
+
+        def visit(column, needed_by):
+            if column in visited:
+                return
+            if column in visiting:
+                raise Exception(f"Feature {column} depends on itself")
+
+            if column not in self.nodes:
+                if column in available_columns:
+                    return
+                raise Exception(f"Column {column} needed by {needed_by} is not in the dataset or a feature")
+
+            visiting.add(column)
+            for input_column in self.nodes[column].inputs:
+                visit(input_column, column)
+            visiting.remove(column)
+
+            visited.add(column)
+            ordered.append(self.nodes[column])
+
+        for column in self.nodes:
+            visit(column, None)
+
+        return ordered
+
+
+# Kernels
+
+# Rows per chunk of the fused z-score, rounded to a whole number of windows
+ZSCORE_CHUNK_ROWS = 1 << 16
+
+def rolling_mean(values, period):
+    # pandas' fixed count roll carries a compensated sum across windows, which
+    # a cumsum difference can't reproduce at rounding ties, so it's kept here
+    return pd.Series(values, dtype=np.float64).rolling(period).mean().to_numpy()
+
+
+def future_diff(values, period):
+    # Matches -Series.pct_change(periods=-period), which pads NaNs first
+    values = np.asarray(values, dtype=np.float64)
+    last_valid = np.where(np.isnan(values), 0, np.arange(len(values)))
+    padded = values[np.maximum.accumulate(last_valid)] if len(values) else values
+
+    out = np.full(len(values), np.nan)
+    if period < len(values):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:-period] = -(padded[:-period] / padded[period:] - 1)
+    return out
+
+
+def ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(numerator, dtype=np.float64) / np.asarray(denominator, dtype=np.float64)
+
+
+def rolling_zscore(series, window='1H'):
+    # Reference pandas version, kept for add_zscore and for checking rolling_zscores
+    rolling_mean = series.fillna(0).rolling(window=window).mean().shift(1)
+    rolling_std = series.fillna(0).rolling(window=window).std().shift(1)
+    return (series - rolling_mean) / rolling_std
+
+
+def block_window_sums(padded, num_rows, left, block):
+    # Sums padded[:, left[i]:i + 1] for every row i, for windows of at most block
+    # rows. Such a window is a block suffix plus the next block's prefix, so the
+    # sum only ever adds values inside the window instead of differencing two
+    # large running totals. padded is zero padded to a whole number of blocks.
+    num_columns = len(padded)
+    blocks = padded.reshape(num_columns, -1, block)
+
+    prefix = np.cumsum(blocks, axis=2).reshape(num_columns, -1)
+    # Suffix sums are kept reversed within each block to avoid another copy
+    reversed_suffix = np.cumsum(blocks[:, :, ::-1], axis=2).reshape(num_columns, -1)
+    suffix_positions = left + (block - 1 - 2 * (left % block))
+
+    window_sums = np.take(reversed_suffix, suffix_positions, axis=1)
+    window_sums += prefix[:, :num_rows]
+
+    # Windows inside one block, e.g. at the start. The exclusive prefix is
+    # exactly 0 at a block start, which is every full window on a dense grid.
+    same_block = np.flatnonzero(left // block == np.arange(num_rows) // block)
+    if len(same_block):
+        starts = left[same_block]
+        window_sums[:, same_block] = prefix[:, same_block] - (prefix[:, starts] - padded[:, starts])
+
+    return window_sums
+
+
+def window_stats(filled, centre, left, block):
+    # Mean and sample variance over filled[:, left[i]:i + 1] for each row i.
+    # Windows holding a single repeated value get a variance of exactly 0 like
+    # pandas, found by counting the value changes inside each window.
+    num_columns, num_rows = filled.shape
+    counts = np.arange(1, num_rows + 1) - left
+
+    # Centred values and their squares, zero padded to whole blocks
+    padded = np.zeros((2 * num_columns, -(-num_rows // block) * block))
+    centred = np.subtract(filled, centre, out=padded[:num_columns, :num_rows])
+    np.multiply(centred, centred, out=padded[num_columns:, :num_rows])
+
+    window_totals = block_window_sums(padded, num_rows, left, block)
+    window_sums, window_squares = window_totals[:num_columns], window_totals[num_columns:]
+
+    means = window_sums / counts
+    variances = np.multiply(window_sums, means, out=window_sums)
+    np.subtract(window_squares, variances, out=variances)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variances /= counts - 1
+    np.maximum(variances, 0.0, out=variances)
+    means += centre
+
+    changes = np.zeros((num_columns, num_rows), dtype=np.int32)
+    np.cumsum(filled[:, 1:] != filled[:, :-1], axis=1, out=changes[:, 1:])
+    constant = changes == np.take(changes, left, axis=1)
+    np.copyto(means, filled, where=constant)
+    variances[constant] = 0.0
+    variances[:, counts == 1] = np.nan
+
+    return means, variances
+
+
+def rolling_zscores(values, index, window='1H'):
+    # Fused rolling_zscore for every column of values (rows x columns). Mean and
+    # variance come from windowed sums of each column centred on its median, and
+    # rows are processed in block aligned chunks that stay in cache.
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    columns = np.ascontiguousarray(values.T)
+    num_columns, num_rows = columns.shape
+
+    zscores = np.full((num_columns, num_rows), np.nan)
+    if num_rows == 0:
+        return zscores.T
+
+    timestamps = pd.DatetimeIndex(index).asi8
+    window_ns = pd.Timedelta(window).value
+    steps = np.diff(timestamps)
+
+    # Time windows are (t - window, t] like pandas, a fixed count on a dense grid
+    if len(steps) and (steps == steps[0]).all() and steps[0] > 0:
+        left = np.maximum(np.arange(num_rows) - (window_ns - 1) // int(steps[0]), 0)
+    else:
+        left = np.searchsorted(timestamps, timestamps - window_ns, side='right')
+    block = int((np.arange(num_rows) + 1 - left).max())
+
+    has_nan = np.isnan(columns).any()
+    centre = np.median(np.where(np.isnan(columns), 0.0, columns) if has_nan else columns, axis=1, keepdims=True)
+    chunk_rows = block * max(1, ZSCORE_CHUNK_ROWS // block)
+
+    for start in range(0, num_rows, chunk_rows):
+        stop = min(start + chunk_rows, num_rows)
+        # The window of the row before the chunk starts at most a block earlier
+        first = max(start - block, 0)
+
+        chunk = columns[:, first:stop]
+        filled = np.where(np.isnan(chunk), 0.0, chunk) if has_nan else chunk
+        chunk_left = np.maximum(left[first:stop] - first, 0)
+        means, variances = window_stats(filled, centre, chunk_left, block)
+
+        # Compare each row with the window ending on the row before it
+        start = max(start, 1)
+        previous = slice(start - first - 1, stop - first - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscores[:, start:stop] = (columns[:, start:stop] - means[:, previous]) / np.sqrt(variances[:, previous])
+
+    return zscores.T
+
+
+def ema(values, span):
+    return emas(values, [span])[0, :, 0]
+
+
+def emas(values, spans):
+    # EMA of every column of values (rows x columns) for each span, as spans x
+    # rows x columns. The trading dataset replaces NaN and inf with 0, so EMAs
+    # are taken over the cleaned columns, cleaned once for all spans. Each span
+    # is one pandas ewm over all the columns, a fused recursion across spans
+    # wouldn't round the same as pandas and the EMAs feed the exit thresholds.
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    cleaned = pd.DataFrame(np.where(np.isfinite(values), values, 0.0))
+
+    return np.stack([
+        cleaned.ewm(span=span, adjust=False, min_periods=span).mean().to_numpy()
+        for span in spans
+    ])
+
+
+# Feature types
+
+@register_feature("zscore")
+def zscore_nodes(feature):
+    window = feature.get("window", "1H")
+    # The columns of one zscore feature are computed together by the fused kernel
+    zscores = {}
+
+    def compute(df, column):
+        if column not in zscores:
+            columns = [c for c in feature["columns"] if f"{c}_zscore" not in df.columns]
+            fused = np.round(rolling_zscores(df[columns].to_numpy(), df.index, window), 2)
+            zscores.update(zip(columns, fused.T))
+        return zscores.pop(column)
+
+    return [
+        FeatureNode(
+            f"{column}_zscore",
+            {"type": "zscore", "column": column, "window": window},
+            [column],
+            lambda df, dataset, column=column: compute(df, column)
+        )
+        for column in feature["columns"]
+    ]
+
+
+@register_feature("news_signal")
+def news_signal_nodes(feature):
+    return [
+        FeatureNode(
+            "news_signal",
+            # Stored columns are recomputed when news resolve to symbols differently
+            {"type": "news_signal", "resolver_version": NEWS_RESOLVER_VERSION},
+            [],
+            lambda df, dataset: dataset.add_news_signals(df)["news_signal"]
+        )
+    ]
+
+
+@register_feature("future_diff")
+def future_diff_nodes(feature):
+    return [
+        FeatureNode(
+            f"{column}_future_diff_{period}",
+            {"type": "future_diff", "column": column, "period": period},
+            [column],
+            lambda df, dataset, column=column, period=period: np.round(future_diff(df[column].to_numpy(), period), 4)
+        )
+        for period in feature["periods"]
+        for column in feature["columns"]
+    ]
+
+
+@register_feature("moving_average")
+def moving_average_nodes(feature):
+    return [
+        FeatureNode(
+            f"{column}_moving_average_MA_{period}",
+            {"type": "moving_average", "column": column, "period": period},
+            [column],
+            lambda df, dataset, column=column, period=period: np.round(rolling_mean(df[column].fillna(0).to_numpy(), period), 2)
+        )
+        for period in feature["periods"]
+        for column in feature["columns"]
+    ]
+
+
+@register_feature("ratio")
+def ratio_nodes(feature):
+    numerator, denominator = feature["columns"]
+    return [
+        FeatureNode(
+            feature["column_name"],
+            {"type": "ratio", "columns": [numerator, denominator]},
+            [numerator, denominator],
+            lambda df, dataset: np.round(ratio(df[numerator].to_numpy(), df[denominator].to_numpy()), 6)
+        )
+    ]
+
+
+@register_feature("ema")
+def ema_nodes(feature):
+    # {"type": "ema", "span": 5, "columns": [...], "column_names": [...]}, or
+    # "spans": [2, 5] for several spans with the columns named {column_name}_{span}
+    spans = feature.get("spans", [feature.get("span")])
+    column_names = feature.get("column_names", [f"{column}_ema" for column in feature["columns"]])
+
+    def ema_column(column_name, span):
+        return f"{column_name}_{span}" if "spans" in feature else column_name
+
+    # Every column and span of one ema feature is computed together
+    computed = {}
+
+    def compute(df, column, span):
+        if (column, span) not in computed:
+            columns = [
+                c for c, column_name in zip(feature["columns"], column_names)
+                if any(ema_column(column_name, s) not in df.columns for s in spans)
+            ]
+            for s, span_emas in zip(spans, np.round(emas(df[columns].to_numpy(), spans), 2)):
+                computed.update({(c, s): values for c, values in zip(columns, span_emas.T)})
+        return computed.pop((column, span))
+
+    return [
+        FeatureNode(
+            ema_column(column_name, span),
+            {"type": "ema", "column": column, "span": span},
+            [column],
+            lambda df, dataset, column=column, span=span: compute(df, column, span),
+            # Stored by column and span whatever the column is called here
+            store_column=f"{column}_ema_{span}"
+        )
+        for span in spans
+        for column, column_name in zip(feature["columns"], column_names)
+    ]
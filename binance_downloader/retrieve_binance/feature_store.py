@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from retrieve_binance.storage import get_storage, StorageNotFoundError
+from retrieve_binance.storage_format import serialise_df, deserialise_df, with_format_extension
+
+# Bump to invalidate every stored feature column, e.g. after changing how one is computed
+FEATURE_STORE_VERSION = 1
+
+# Columns loaded or saved in this process are kept in memory up to
+# FEATURE_CACHE_BYTES, least recently used dropped first, so running several
+# configs of a symbol skips storage. A month of 1s rows is ~40MB a column with
+# its index, 0 turns the cache off.
+FEATURE_CACHE_BYTES = int(os.getenv("FEATURE_CACHE_BYTES", 256 * 1024 ** 2))
+FEATURE_CACHE = OrderedDict()
+
+FEATURE_MANIFEST = "sources.json"
+
+
+def stale_feature_paths(storage, interval="monthly"):
+    # Feature blobs nothing will read again. Those are folders whose sources
+    # have changed or gone, or that were written by an older
+    # FEATURE_STORE_VERSION, and columns from before folders had manifests.
+    folders = {}
+    for path in storage.list(f"features/{interval}/"):
+        folder, file_name = path.rsplit("/", 1)
+        folders.setdefault(folder, []).append(file_name)
+
+    stale_paths = []
+    for folder, file_names in folders.items():
+        if FEATURE_MANIFEST not in file_names:
+            stale_paths += [f"{folder}/{file_name}" for file_name in file_names]
+            continue
+
+        manifest = json.loads(storage.get(f"{folder}/{FEATURE_MANIFEST}"))
+        is_stale = manifest["feature_store_version"] != FEATURE_STORE_VERSION
+        for source_path, source_version in manifest["sources"].items():
+            try:
+                is_stale = is_stale or storage.version(source_path) != source_version
+            except StorageNotFoundError:
+                is_stale = True
+
+        if is_stale:
+            # The manifest last, so a folder is still recognised if deleting stops part way
+            stale_paths += [f"{folder}/{file_name}" for file_name in file_names if file_name != FEATURE_MANIFEST]
+            stale_paths.append(f"{folder}/{FEATURE_MANIFEST}")
+
+    return stale_paths
+
+
+def feature_spec_hash(spec):
+    serialized_spec = json.dumps({"version": FEATURE_STORE_VERSION, **spec}, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(serialized_spec).hexdigest()[:16]
+
+
+class FeatureStore():
+    # Keeps each feature column of a trading dataset in its own blob, keyed by
+    # a hash of the feature spec, in a folder per version of the reduced trades
+    # it was computed from. Adding a feature writes one column, loading reads
+    # only the columns asked for. Each folder has a manifest of the blobs and
+    # versions it was computed from, sources, so stale_feature_paths can tell
+    # which folders nothing will read again.
+
+    def __init__(self, symbol, date, base_version, interval="monthly", sources=None):
+        self.symbol = symbol
+        self.date = date
+        self.interval = interval
+        self.base_version = base_version
+        # {blob path: version} of the reduced trades, and of the month before when warmed up
+        self.sources = sources
+        self.base_folder = f"features/{interval}/{symbol}/{date}/{feature_spec_hash({'base_version': base_version})}"
+        self.manifest_saved = False
+
+
+    def column_path(self, column, spec):
+        spec_hash = feature_spec_hash({"column": column, **spec})
+        return with_format_extension(f"{self.base_folder}/{column}-{spec_hash}.csv")
+
+
+    def load(self, column, spec):
+        column_path = self.column_path(column, spec)
+
+        if column_path in FEATURE_CACHE:
+            FEATURE_CACHE.move_to_end(column_path)
+            return FEATURE_CACHE[column_path]
+
+        try:
+            data = get_storage().get(column_path)
+        except StorageNotFoundError:
+            return None
+
+        print(f"> Loaded {column} from feature store")
+        series = deserialise_df(data, parse_dates=True)[column]
+        self.__cache(column_path, series)
+        return series
+
+
+    def save(self, column, spec, series):
+        print(f"> Saving {column} to feature store")
+        column_path = self.column_path(column, spec)
+        # Before the column, so a folder with columns always has one
+        self.__save_manifest()
+        get_storage().put(column_path, serialise_df(series.to_frame(column)))
+        # A copy, the dataset's later in place changes would show through a view
+        cached_series = series.copy()
+        cached_series.name = column
+        self.__cache(column_path, cached_series)
+
+
+    def __save_manifest(self):
+        if self.manifest_saved or self.sources is None:
+            return
+
+        manifest_path = f"{self.base_folder}/{FEATURE_MANIFEST}"
+        if not get_storage().exists(manifest_path):
+            manifest = {"feature_store_version": FEATURE_STORE_VERSION, "sources": self.sources}
+            get_storage().put(manifest_path, json.dumps(manifest, sort_keys=True).encode("utf-8"))
+
+        self.manifest_saved = True
+
+
+    def __cache(self, column_path, series):
+        FEATURE_CACHE.pop(column_path, None)
+        if series.memory_usage(index=True) <= FEATURE_CACHE_BYTES:
+            FEATURE_CACHE[column_path] = series
+
+        while sum(cached.memory_usage(index=True) for cached in FEATURE_CACHE.values()) > FEATURE_CACHE_BYTES:
+            FEATURE_CACHE.popitem(last=False)
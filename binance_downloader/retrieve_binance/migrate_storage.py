@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+from retrieve_binance.storage import get_storage
+from retrieve_binance.storage_format import STORAGE_FORMAT, serialise_df, deserialise_df, with_format_extension, convert_csv_file
+
+# One-shot migration of legacy CSV blobs to the configured storage format
+# Usage: python -m retrieve_binance.migrate_storage [--delete-csv]
+
+MIGRATE_PREFIXES = [
+    "reduced_trades/",
+    "aggTrades/",
+]
+
+
+def migrate_blob(csv_path, delete_csv=False):
+    target_path = with_format_extension(csv_path)
+    storage = get_storage()
+
+    if storage.exists(target_path):
+        print(f"> {target_path} already exists, skipping")
+        return False
+
+    if csv_path.startswith("aggTrades/"):
+        migrate_large_blob(storage, csv_path, target_path)
+    else:
+        data = storage.get(csv_path)
+        storage.put(target_path, serialise_df(deserialise_df(data, parse_dates=True)))
+    print(f"> Migrated {csv_path} -> {target_path}")
+
+    if delete_csv:
+        storage.delete(csv_path)
+        print(f"> Deleted {csv_path}")
+
+    return True
+
+
+def migrate_large_blob(storage, csv_path, target_path):
+    # A month of trades can be larger than memory, so it is converted a block
+    # at a time from a file on disk, read in place when the store is local
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_csv_path = storage.local_path(csv_path)
+
+        if local_csv_path is None:
+            local_csv_path = os.path.join(temp_dir, "blob.csv")
+            with open(local_csv_path, "wb") as f:
+                for chunk in storage.stream(csv_path):
+                    f.write(chunk)
+
+        converted_path = convert_csv_file(local_csv_path, converted_path=os.path.join(temp_dir, "converted"))
+        with open(converted_path, "rb") as data:
+            storage.put(target_path, data)
+
+
+def migrate_csv_blobs(prefixes=MIGRATE_PREFIXES, delete_csv=False):
+    if STORAGE_FORMAT == "csv":
+        print("> STORAGE_FORMAT is csv, nothing to migrate")
+        return 0
+
+    migrated = 0
+
+    for prefix in prefixes:
+        print(f"> Migrating blobs under {prefix}")
+        # Listed up front as migrating adds blobs under the same prefix
+        for blob_path in list(get_storage().list(prefix)):
+            if not blob_path.endswith(".csv"):
+                continue
+            if migrate_blob(blob_path, delete_csv=delete_csv):
+                migrated += 1
+
+    print(f"> Migrated {migrated} blobs to {STORAGE_FORMAT}")
+    return migrated
+
+
+if __name__ == "__main__":
+    migrate_csv_blobs(delete_csv="--delete-csv" in sys.argv[1:])
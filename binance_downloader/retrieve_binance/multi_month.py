@@ -0,0 +1,28 @@
+import pandas as pd
+
+# Ranges of months for runs over several months. Each month's features are
+# warmed up with the end of the month before, see RetriveDataset's warm_up, so
+# the 1H z-scores carry across month boundaries, and months are run on their
+# own, e.g. by run_sweep with a list of dates.
+
+# The 1H z-score window, and more for the moving averages and EMAs of the z-scores
+MONTH_WARM_UP = '2H'
+
+
+def month_range(start_date, end_date):
+    # Months from start_date to end_date inclusive, e.g. ["2023-08", "2023-09"]
+    return [str(period) for period in pd.period_range(start_date, end_date, freq='M')]
+
+
+def walk_forward_splits(dates, train_months, test_months=1, step_months=None):
+    # Rolling (train dates, test dates), each test range straight after its train
+    # range, moved on by step_months (test_months by default)
+    step_months = test_months if step_months is None else step_months
+
+    splits = []
+    for start in range(0, len(dates) - train_months - test_months + 1, step_months):
+        test_start = start + train_months
+        splits.append((dates[start:test_start], dates[test_start:test_start + test_months]))
+
+    return splits
+
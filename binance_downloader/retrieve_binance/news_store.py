@@ -0,0 +1,363 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# News in SQLite, so a symbol's news over a time range is found with index
+# lookups instead of loading and scanning every item. News are kept by time.
+# Each item is resolved once to the Binance futures symbols it's about, see
+# binance_symbols, which are stored with it and as postings in news_symbols,
+# keyed by symbol and time. New news are merged in by id, see
+# retrieve_news.sync_news, and each merge that changes the store bumps its
+# version.
+#
+# NewsCache keeps every posting in memory once per process, see get_news_cache.
+
+LOCAL_LOCATION = os.getenv("LOCAL_LOCATION")
+NEWS_DB = os.getenv("NEWS_DB", f"{LOCAL_LOCATION}/news/news.db")
+NEWS_SCHEMA_VERSION = 2
+# Bump when binance_symbols changes, e.g. a new alias, to resolve the stored news again
+NEWS_RESOLVER_VERSION = 2
+
+# Coins Binance futures quotes per 1000, e.g. PEPEUSDT is listed as 1000PEPEUSDT
+THOUSAND_ASSETS = ["PEPE", "SHIB", "FLOKI", "LUNC", "XEC", "BONK", "SATS", "RATS"]
+
+# Names the news use for a coin that Binance lists under another
+SYMBOL_ALIASES = {
+    "CURVE": "CRV",
+    **{asset: f"1000{asset}" for asset in THOUSAND_ASSETS},
+}
+QUOTE_ASSET = "USDT"
+# News items looked up at a time when merging
+MERGE_BATCH_SIZE = 10000
+
+_news_cache = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    number INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    time INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    binance_symbols TEXT NOT NULL DEFAULT '[]'
+);
+
+CREATE INDEX IF NOT EXISTS news_by_time ON news (time);
+
+CREATE TABLE IF NOT EXISTS news_symbols (
+    symbol TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    news_number INTEGER NOT NULL REFERENCES news(number) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS news_symbols_by_time ON news_symbols (symbol, time);
+CREATE INDEX IF NOT EXISTS news_symbols_by_news ON news_symbols (news_number);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def news_id(news_item):
+    # Items without an _id are keyed by their contents
+    if "_id" in news_item:
+        return str(news_item["_id"])
+    return hashlib.sha256(json.dumps(news_item, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def binance_symbol(symbol):
+    # The Binance futures symbol for a symbol as the news or a caller write it,
+    # e.g. APT_USDT or APTUSDT to APTUSDT, CURVEUSDT to CRVUSDT, PEPEUSDT to
+    # 1000PEPEUSDT. None if it isn't quoted in USDT.
+    symbol = symbol.upper().replace("_", "")
+    if not symbol.endswith(QUOTE_ASSET) or symbol == QUOTE_ASSET:
+        return None
+
+    base_asset = symbol[:-len(QUOTE_ASSET)]
+    return SYMBOL_ALIASES.get(base_asset, base_asset) + QUOTE_ASSET
+
+
+def binance_symbols(news_item):
+    # Sorted Binance futures symbols the item is about, from its own symbols
+    # and its binance-futures suggestions
+    symbols = list(news_item.get("symbols") or [])
+
+    for suggestion in news_item.get("suggestions") or []:
+        for suggestion_symbol in suggestion.get("symbols") or []:
+            if suggestion_symbol.get("exchange") == "binance-futures":
+                symbols.append(suggestion_symbol["symbol"])
+
+    resolved = {binance_symbol(symbol) for symbol in symbols if isinstance(symbol, str)}
+    resolved.discard(None)
+    return sorted(resolved)
+
+
+class NewsStore():
+
+    def __init__(self, db_path=NEWS_DB):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.db_path = db_path
+        self.connections = threading.local()
+
+        # The store only holds what the news API gives, so one from before it
+        # was versioned is started again. Version 1 postings were by how the
+        # item named the symbol, they're resolved again from the stored items.
+        schema_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version == 0:
+            self.connection.executescript("DROP TABLE IF EXISTS news_symbols; DROP TABLE IF EXISTS news; DROP TABLE IF EXISTS meta;")
+        elif schema_version == 1:
+            self.connection.executescript("DROP TABLE news_symbols; ALTER TABLE news ADD COLUMN binance_symbols TEXT NOT NULL DEFAULT '[]';")
+
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {NEWS_SCHEMA_VERSION}")
+
+        if self.__meta("resolver_version") != str(NEWS_RESOLVER_VERSION):
+            self.__resolve_symbols()
+
+
+    @property
+    def connection(self):
+        # SQLite connections can't be shared between processes or threads, so
+        # each thread opens its own and a forked worker, e.g. a sweep's, doesn't
+        # use the one it inherited
+        if getattr(self.connections, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.db_path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+
+            self.connections.pid = os.getpid()
+            self.connections.connection = connection
+
+        return self.connections.connection
+
+
+    def close(self):
+        self.connection.close()
+        self.connections.pid = None
+
+
+    @property
+    def version(self):
+        # Goes up with every merge that changes the news
+        return int(self.__meta("version") or 0)
+
+
+    @property
+    def last_synced(self):
+        # Unix time of the last sync with the news API
+        last_synced = self.__meta("last_synced")
+        return None if last_synced is None else int(last_synced)
+
+
+    def set_last_synced(self, last_synced):
+        with self.connection:
+            self.__set_meta("last_synced", last_synced)
+
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+
+
+    def newest_time(self):
+        return self.connection.execute("SELECT MAX(time) FROM news").fetchone()[0]
+
+
+    def merge(self, news):
+        # Adds news, a list of news items, in one transaction. Items stored
+        # under the same id are replaced when they've changed. Returns how many
+        # items were added or replaced.
+        news_items = {}
+        for news_item in news:
+            if "time" in news_item:
+                # The last of any items with the same id is kept
+                news_items[news_id(news_item)] = json.dumps(news_item)
+
+        with self.connection:
+            stored_ids = set()
+            # Items already stored unchanged, looked up a batch at a time.
+            # Nothing to compare against on the first import
+            item_ids = list(news_items) if self.count() > 0 else []
+            for start in range(0, len(item_ids), MERGE_BATCH_SIZE):
+                rows = self.connection.execute(
+                    "SELECT id, item FROM news WHERE id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(item_ids[start:start + MERGE_BATCH_SIZE]),)
+                )
+                stored_ids.update(item_id for item_id, item in rows if news_items[item_id] == item)
+            news_items = {item_id: item for item_id, item in news_items.items() if item_id not in stored_ids}
+
+            if len(news_items) == 0:
+                print("> No new news")
+                return 0
+
+            # The postings of replaced items go with them
+            self.connection.executemany("DELETE FROM news WHERE id = ?", [(item_id,) for item_id in news_items])
+            self.__add_news(news_items)
+            self.__set_meta("version", self.version + 1)
+
+        print(f"> Merged {len(news_items)} news items")
+        return len(news_items)
+
+
+    def news_items(self, numbers):
+        # News items by their number in the store, in time order
+        rows = self.connection.execute(
+            "SELECT item, binance_symbols FROM news WHERE number IN (SELECT value FROM json_each(?)) ORDER BY time",
+            (json.dumps([int(number) for number in numbers]),)
+        )
+        return [self.__news_item(row) for row in rows]
+
+
+    def news_between(self, start_timestamp, end_timestamp):
+        # News items from start to end inclusive, times in ms, in time order
+        rows = self.connection.execute(
+            "SELECT item, binance_symbols FROM news WHERE time BETWEEN ? AND ? ORDER BY time",
+            (start_timestamp, end_timestamp)
+        )
+        return [self.__news_item(row) for row in rows]
+
+
+    def symbol_news(self, symbol, start_timestamp, end_timestamp):
+        # News items about symbol, e.g. APTUSDT or APT_USDT, from start to end inclusive
+        rows = self.connection.execute(
+            """
+            SELECT news.item, news.binance_symbols FROM news_symbols JOIN news ON news.number = news_symbols.news_number
+            WHERE news_symbols.symbol = ? AND news_symbols.time BETWEEN ? AND ?
+            ORDER BY news_symbols.time
+            """,
+            (binance_symbol(symbol), start_timestamp, end_timestamp)
+        )
+        return [self.__news_item(row) for row in rows]
+
+
+    def __meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+
+    def __set_meta(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+    def __news_item(self, row):
+        # Items carry the symbols they were resolved to
+        news_item = json.loads(row[0])
+        news_item["binance_symbols"] = json.loads(row[1])
+        return news_item
+
+
+    def __resolve_symbols(self):
+        # Resolves every stored item again, without going back to the news API
+        print("> Resolving the symbols of stored news...")
+
+        news_rows = []
+        posting_rows = []
+        for number, news_time, item in self.connection.execute("SELECT number, time, item FROM news"):
+            symbols = binance_symbols(json.loads(item))
+            news_rows.append((json.dumps(symbols), number))
+            posting_rows += [(symbol, news_time, number) for symbol in symbols]
+
+        with self.connection:
+            self.connection.execute("DELETE FROM news_symbols")
+            self.connection.executemany("UPDATE news SET binance_symbols = ? WHERE number = ?", news_rows)
+            self.connection.executemany("INSERT INTO news_symbols (symbol, time, news_number) VALUES (?, ?, ?)", sorted(posting_rows))
+            self.__set_meta("resolver_version", NEWS_RESOLVER_VERSION)
+            # The news caches hold the old postings
+            self.__set_meta("version", self.version + 1)
+
+
+    def __add_news(self, news_items):
+        # news_items are serialised news items by id
+        news_rows = []
+        for item_id, item in news_items.items():
+            news_item = json.loads(item)
+            news_rows.append((item_id, int(news_item["time"]), item, binance_symbols(news_item)))
+        news_rows.sort(key=lambda row: row[1])
+
+        first_number = self.connection.execute("SELECT COALESCE(MAX(number), 0) + 1 FROM news").fetchone()[0]
+        posting_rows = []
+        for number, (item_id, news_time, item, symbols) in enumerate(news_rows, first_number):
+            posting_rows += [(symbol, news_time, number) for symbol in symbols]
+
+        # In index order, so the inserts append to the indexes
+        self.connection.executemany(
+            "INSERT INTO news (number, id, time, item, binance_symbols) VALUES (?, ?, ?, ?, ?)",
+            [(number, item_id, news_time, item, json.dumps(symbols)) for number, (item_id, news_time, item, symbols) in enumerate(news_rows, first_number)]
+        )
+        self.connection.executemany("INSERT INTO news_symbols (symbol, time, news_number) VALUES (?, ?, ?)", sorted(posting_rows))
+
+
+class NewsCache():
+    # Every posting of the news store as two flat arrays, the times and news
+    # numbers of each symbol a slice sorted by time. Loaded once per
+    # process and shared by every GetCryptoNews. Nothing is written to the
+    # arrays after loading, so processes forked after get_news_cache share
+    # them instead of copying them. Items are read through the store, which
+    # opens a connection in each process and thread that uses it.
+
+    def __init__(self, news_store):
+        self.news_store = news_store
+        self.refresh()
+
+
+    def refresh(self):
+        # Reloads from the store, e.g. after a sync
+        print("> Loading news cache...")
+        self.version = self.news_store.version
+
+        connection = self.news_store.connection
+        groups = connection.execute("SELECT symbol, COUNT(*) FROM news_symbols GROUP BY symbol ORDER BY symbol").fetchall()
+        postings = connection.execute("SELECT time, news_number FROM news_symbols ORDER BY symbol, time").fetchall()
+        postings = np.array(postings, dtype=np.int64).reshape(-1, 2)
+
+        self.times = np.ascontiguousarray(postings[:, 0])
+        self.numbers = np.ascontiguousarray(postings[:, 1])
+
+        self.slices = {}
+        start = 0
+        for symbol, count in groups:
+            self.slices[symbol] = (start, start + count)
+            start += count
+
+        print(f"> News cache: {len(self.times)} postings of {len(self.slices)} symbols, {self.memory_usage() / 1e6:.1f}MB")
+
+
+    def refresh_if_changed(self):
+        if self.news_store.version != self.version:
+            self.refresh()
+
+
+    def memory_usage(self):
+        # Bytes held, the arrays and roughly the slice table
+        return self.times.nbytes + self.numbers.nbytes + len(self.slices) * 200
+
+
+    def symbol_news(self, symbol, start_timestamp, end_timestamp):
+        # Times and numbers of the same news as NewsStore.symbol_news, in time order
+        symbol = binance_symbol(symbol)
+        if symbol not in self.slices:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+        start, end = self.slices[symbol]
+        first = start + np.searchsorted(self.times[start:end], start_timestamp, side='left')
+        last = start + np.searchsorted(self.times[start:end], end_timestamp, side='right')
+
+        return self.times[first:last], self.numbers[first:last]
+
+
+def get_news_cache():
+    # Built on first use, call before forking workers for them to share the arrays
+    global _news_cache
+
+    if _news_cache is None:
+        _news_cache = NewsCache(NewsStore())
+
+    return _news_cache
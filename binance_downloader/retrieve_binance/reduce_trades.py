@@ -0,0 +1,333 @@
+import numpy as np
+import pandas as pd
+
+# Rows of agg trades parsed at a time when streaming
+REDUCE_CHUNK_SIZE = 1_000_000
+
+# numpy: bincount reducer with compensated sums, matches pandas exactly (default)
+# bincount: plain bincount sums, fastest but can differ in the last bit before rounding
+# pandas: the original groupby and merge reducer
+REDUCE_ENGINES = ["numpy", "bincount", "pandas"]
+
+# Coarser reduced trades rolled up from the 1s buckets, see TradeReducer.to_pyramid
+PYRAMID_RESOLUTIONS = ['5S', '1min', '5min']
+
+
+def kahan_add_at(sums, compensations, keys, values):
+    # Adds values into sums[keys] with Kahan compensation, applied in row order
+    # within each key exactly like pandas' groupby sum/mean. Plain bincount
+    # sums differ in the last bit, which flips the 2dp rounding of quantities.
+    if len(keys) == 0:
+        return
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    group_starts = np.r_[0, np.flatnonzero(np.diff(sorted_keys)) + 1]
+    group_sizes = np.diff(np.r_[group_starts, len(keys)])
+    group_keys = sorted_keys[group_starts]
+    max_size = int(group_sizes.max())
+
+    # Round n adds the n-th value of every key. Keys are ordered largest group first
+    # so each round works on a contiguous prefix instead of scattered indexes.
+    # uint16 lets numpy radix sort, the common case at 1s buckets
+    size_order = max_size - group_sizes
+    if max_size <= np.iinfo(np.uint16).max:
+        size_order = size_order.astype(np.uint16)
+    by_size = np.argsort(size_order, kind='stable')
+    group_position = np.empty(len(group_sizes), dtype=np.int64)
+    group_position[by_size] = np.arange(len(group_sizes))
+
+    groups_per_round = len(group_sizes) - np.cumsum(np.bincount(group_sizes, minlength=max_size + 1))[:max_size]
+    round_offsets = np.r_[0, np.cumsum(groups_per_round)]
+
+    rank = np.arange(len(keys)) - np.repeat(group_starts, group_sizes)
+    round_values = np.empty(len(keys))
+    round_values[round_offsets[rank] + np.repeat(group_position, group_sizes)] = values[order]
+
+    ordered_keys = group_keys[by_size]
+    running_sums = sums[ordered_keys]
+    running_compensations = compensations[ordered_keys]
+    has_infinite = not np.isfinite(values).all()
+
+    for n in range(max_size):
+        active = groups_per_round[n]
+        y = round_values[round_offsets[n]:round_offsets[n] + active] - running_compensations[:active]
+        t = running_sums[:active] + y
+        running_compensations[:active] = (t - running_sums[:active]) - y
+        running_sums[:active] = t
+
+        # Infinite values give a NaN compensation, pandas resets it to 0
+        if has_infinite:
+            running_compensations[np.isnan(running_compensations)] = 0
+
+    sums[ordered_keys] = running_sums
+    compensations[ordered_keys] = running_compensations
+
+
+class TradeReducer():
+    # Accumulates agg trades into fixed-size arrays indexed by bucket (second) of the month.
+    # Chunks must be added in file order, trades in the same second are summed
+    # across chunk boundaries, and to_frame gives the same frame as the pandas reducer.
+    # With exact=False sums are plain bincounts, see REDUCE_ENGINES.
+
+    def __init__(self, date, aggregation_window='1S', exact=True):
+        self.exact = exact
+        self.window_ms = int(pd.Timedelta(aggregation_window).total_seconds() * 1000)
+        self.aggregation_window = aggregation_window
+
+        month_start = pd.Timestamp(f"{date}-01")
+        month_end = month_start + pd.offsets.MonthBegin(1)
+        # Bucket number of index 0, buckets are counted from the epoch
+        self.origin = month_start.value // 1_000_000 // self.window_ms
+        size = (month_end - month_start) // pd.Timedelta(milliseconds=self.window_ms)
+
+        self.price_sum = np.zeros(size)
+        self.price_compensation = np.zeros(size)
+        self.trade_count = np.zeros(size, dtype=np.int64)
+        # Per side arrays are flat with index bucket * 2 + side,
+        # side 0 is sells (not buyer maker), side 1 buys
+        self.quantity = np.zeros(size * 2)
+        self.quantity_compensation = np.zeros(size * 2)
+        self.num_trades = np.zeros(size * 2)
+        self.side_count = np.zeros(size * 2, dtype=np.int64)
+        # Sum of price * quantity, only used for the pyramid's vwap so not compensated
+        self.notional = np.zeros(size)
+
+
+    def add_trades(self, agg_trades_df):
+        if len(agg_trades_df) == 0:
+            return
+
+        transact_time = agg_trades_df['transact_time']
+        if pd.api.types.is_datetime64_any_dtype(transact_time):
+            transact_time = transact_time.values.astype('datetime64[ms]').astype(np.int64)
+        else:
+            transact_time = transact_time.to_numpy(dtype=np.int64)
+
+        buckets = transact_time // self.window_ms
+        self.__ensure_capacity(int(buckets.min()), int(buckets.max()))
+        buckets -= self.origin
+
+        side = agg_trades_df['is_buyer_maker'].to_numpy(dtype=bool).astype(np.int64)
+        side_keys = buckets * 2 + side
+        num_trades = (agg_trades_df['last_trade_id'].to_numpy() - agg_trades_df['first_trade_id'].to_numpy() + 1).astype(np.float64)
+
+        price = agg_trades_df['price'].to_numpy(dtype=np.float64)
+        quantity = agg_trades_df['quantity'].to_numpy(dtype=np.float64)
+
+        first, last = int(buckets.min()), int(buckets.max())
+        span = last - first + 1
+        local_keys = side_keys - first * 2
+
+        if self.exact:
+            kahan_add_at(self.price_sum, self.price_compensation, buckets, price)
+            # Split by side as each side's keys stay in time order, which keeps the sort cheap
+            for is_side in [side == 0, side == 1]:
+                kahan_add_at(self.quantity, self.quantity_compensation, side_keys[is_side], quantity[is_side])
+        else:
+            self.price_sum[first:last + 1] += np.bincount(buckets - first, weights=price, minlength=span)
+            self.quantity[first * 2:(last + 1) * 2] += np.bincount(local_keys, weights=quantity, minlength=span * 2)
+
+        # Trade counts are whole numbers so plain bincounts are exact
+
+        self.trade_count[first:last + 1] += np.bincount(buckets - first, minlength=span)
+        self.num_trades[first * 2:(last + 1) * 2] += np.bincount(local_keys, weights=num_trades, minlength=span * 2)
+        self.side_count[first * 2:(last + 1) * 2] += np.bincount(local_keys, minlength=span * 2)
+        self.notional[first:last + 1] += np.bincount(buckets - first, weights=price * quantity, minlength=span)
+
+
+    def add_chunks(self, agg_trades_chunks):
+        for i, agg_trades_df in enumerate(agg_trades_chunks):
+            print(f"> Reducing agg trades chunk {i}", end='\r')
+            self.add_trades(agg_trades_df)
+
+        print()
+
+
+    def to_frame(self):
+        return self.__build_frame(
+            self.origin,
+            self.aggregation_window,
+            self.price_sum,
+            self.trade_count,
+            self.quantity.reshape(-1, 2),
+            self.num_trades.reshape(-1, 2),
+            self.side_count.reshape(-1, 2),
+        )
+
+
+    def to_pyramid(self, resolutions=PYRAMID_RESOLUTIONS):
+        # Rolls the buckets up to each coarser resolution. Sums and counts add up,
+        # avg_price stays the mean price of the trades in the window and vwap is
+        # price weighted by quantity. Windows are aligned to the epoch like dt.floor.
+        pyramid = {}
+        buckets = np.arange(len(self.price_sum)) + self.origin
+
+        for resolution in resolutions:
+            resolution_ms = int(pd.Timedelta(resolution).total_seconds() * 1000)
+            if resolution_ms % self.window_ms != 0:
+                raise Exception(f"Resolution {resolution} is not a multiple of {self.aggregation_window}")
+
+            factor = resolution_ms // self.window_ms
+            coarse_buckets = buckets // factor
+            origin = int(coarse_buckets[0])
+            keys = coarse_buckets - origin
+            side_keys = np.repeat(keys * 2, 2) + np.tile([0, 1], len(keys))
+
+            def rollup(values, rollup_keys=keys):
+                return np.bincount(rollup_keys, weights=values)
+
+            pyramid[resolution] = self.__build_frame(
+                origin,
+                resolution,
+                rollup(self.price_sum),
+                rollup(self.trade_count),
+                rollup(self.quantity, side_keys).reshape(-1, 2),
+                rollup(self.num_trades, side_keys).reshape(-1, 2),
+                rollup(self.side_count, side_keys).reshape(-1, 2),
+                notional=rollup(self.notional),
+            )
+
+        return pyramid
+
+
+    def __build_frame(self, origin, window, price_sum, trade_count, quantity, num_trades, side_count, notional=None):
+        traded = np.flatnonzero(trade_count)
+        if len(traded) == 0:
+            return None
+
+        # The output runs from the first to the last bucket that had a trade
+        first, last = traded[0], traded[-1] + 1
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_price = price_sum[first:last] / trade_count[first:last]
+
+        has_side = side_count[first:last] > 0
+        quantity = np.where(has_side, quantity[first:last], np.nan)
+        num_trades = np.where(has_side, num_trades[first:last], np.nan)
+
+        window_ms = int(pd.Timedelta(window).total_seconds() * 1000)
+        start = pd.Timestamp((origin + first) * window_ms, unit='ms')
+        index = pd.date_range(start, periods=last - first, freq=window, name='floored_time')
+
+        agg_df = pd.DataFrame({
+            "avg_price": np.round(avg_price, 6),
+            "sum_asset_bought": np.round(quantity[:, 1], 2),
+            "num_of_trades_bought": num_trades[:, 1],
+            "sum_asset_sold": np.round(quantity[:, 0], 2),
+            "num_of_trades_sold": num_trades[:, 0],
+        }, index=index)
+
+        agg_df['avg_price'] = agg_df['avg_price'].ffill()
+
+        if notional is not None:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                vwap = notional[first:last] / np.nansum(quantity, axis=1)
+            agg_df.insert(1, 'vwap', np.round(vwap, 6))
+            agg_df['vwap'] = agg_df['vwap'].ffill()
+
+        return agg_df
+
+
+    def __ensure_capacity(self, first_bucket, last_bucket):
+        # Binance occasionally has trades just outside the month, grow the arrays to fit
+        pad_before = max(0, self.origin - first_bucket)
+        pad_after = max(0, last_bucket - (self.origin + len(self.price_sum)) + 1)
+
+        if pad_before == 0 and pad_after == 0:
+            return
+
+        for name in ["price_sum", "price_compensation", "trade_count", "notional"]:
+            setattr(self, name, np.pad(getattr(self, name), (pad_before, pad_after)))
+
+        for name in ["quantity", "quantity_compensation", "num_trades", "side_count"]:
+            setattr(self, name, np.pad(getattr(self, name), (pad_before * 2, pad_after * 2)))
+
+        self.origin -= pad_before
+
+
+def stream_reduce_trades(agg_trades_chunks, date, aggregation_window='1S', exact=True):
+    # Returns the filled reducer so callers can take the frame and the pyramid from one pass
+    reducer = TradeReducer(date, aggregation_window, exact=exact)
+    reducer.add_chunks(agg_trades_chunks)
+    return reducer
+
+
+def reduce_trades(agg_trades_df, date, aggregation_window='1S', engine="numpy"):
+    print(f"> Reducing trades with {engine} engine...")
+
+    if engine == "pandas":
+        return reduce_trades_pandas(agg_trades_df, aggregation_window)
+
+    if engine not in REDUCE_ENGINES:
+        raise Exception(f"Unknown reduce engine {engine}. Choose from {REDUCE_ENGINES}")
+
+    if agg_trades_df is None:
+        print("No trades to reduce")
+        return None
+
+    reducer = TradeReducer(date, aggregation_window, exact=engine == "numpy")
+    reducer.add_trades(agg_trades_df)
+    return reducer.to_frame()
+
+
+def reduce_trades_pandas(agg_trades_df, aggregation_window='1S'):
+    # Reference reducer, kept to check the numpy engines against
+
+    if agg_trades_df is None:
+        print("No trades to reduce")
+        return None
+
+    # Check if 'transact_time' is not already a datetime object
+    if not isinstance(agg_trades_df['transact_time'].iloc[0], pd.Timestamp):
+        # Convert transact_time to datetime
+        agg_trades_df['transact_time'] = pd.to_datetime(agg_trades_df['transact_time'], unit='ms')
+
+    # Round transact_time to the nearest second
+    agg_trades_df['floored_time'] = agg_trades_df['transact_time'].dt.floor(aggregation_window)
+
+    # Calculate the number of trades for each row
+    agg_trades_df['num_trades'] = agg_trades_df['last_trade_id'] - agg_trades_df['first_trade_id'] + 1
+
+    # Compute average price for all transactions
+    overall_avg_price = agg_trades_df.groupby('floored_time')['price'].mean()
+
+    # Split dataframe for buys and sells
+    buys = agg_trades_df[agg_trades_df['is_buyer_maker']]
+    sells = agg_trades_df[~agg_trades_df['is_buyer_maker']]
+
+    # Reduce separately for buy and sell
+    buy_agg = buys.groupby('floored_time').agg(
+        sum_asset_bought=('quantity', 'sum'),
+        num_of_trades_bought=('num_trades', 'sum')
+    )
+
+    sell_agg = sells.groupby('floored_time').agg(
+        sum_asset_sold=('quantity', 'sum'),
+        num_of_trades_sold=('num_trades', 'sum')
+    )
+
+    # Merge on the floored_time
+    agg_df = pd.merge(overall_avg_price, buy_agg, on='floored_time', how='outer')
+    agg_df = pd.merge(agg_df, sell_agg, on='floored_time', how='outer').reset_index()
+
+    # Round off float columns to desired precision
+    precision = 2  # Change this as per your requirement
+    agg_df = agg_df.round({'sum_asset_bought': precision, 'sum_asset_sold': precision})
+    agg_df = agg_df.round({'price': 6})
+
+    # Rename the price column to avg_price
+    agg_df.rename(columns={'price': 'avg_price'}, inplace=True)
+
+    # Set index to floored_time
+    agg_df.index = pd.to_datetime(agg_df.floored_time)
+
+    # Drop the floored_time column
+    agg_df.drop('floored_time', axis=1, inplace=True)
+
+    # Fill forward avg price values
+    agg_df = agg_df.resample('1S').first()
+
+    agg_df['avg_price'] = agg_df['avg_price'].ffill()
+
+    return agg_df
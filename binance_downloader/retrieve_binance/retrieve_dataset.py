@@ -1,25 +1,25 @@
 import os
 import pandas as pd
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
-from azure.core.exceptions import ResourceNotFoundError
-import io
 from retrieve_binance.agg_trades_downloader import retrieve_agg_trades
-from retrieve_binance.retrieve_news import GetCryptoNews
+from retrieve_binance.retrieve_news import GetCryptoNews, news_signal
+from retrieve_binance.storage import get_storage, StorageNotFoundError
+from retrieve_binance.storage_format import serialise_df, deserialise_df, iter_df_chunks, with_format_extension, legacy_csv_path, read_storage_windows
+from retrieve_binance.feature_store import FeatureStore
+from retrieve_binance.feature_engine import FeatureGraph, rolling_zscore
+from retrieve_binance.reduce_trades import reduce_trades, stream_reduce_trades, REDUCE_CHUNK_SIZE, PYRAMID_RESOLUTIONS
 import numpy as np
-import json
 
 load_dotenv()
 
 
-CONTAINER_NAME = "binancedata"
-BLOB_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-BLOB_SERVICE_CLIENT = BlobServiceClient.from_connection_string(BLOB_CONNECTION_STRING)
-ACCOUNT_KEY = os.environ['AZURE_STORAGE_ACCOUNT_KEY']
-ACCOUNT_URL = os.environ['AZURE_STORAGE_ACCOUNT_URL']
 LOCAL_LOCATION = os.environ['LOCAL_LOCATION']
 
 
+def previous_month(date):
+    return (pd.Period(date, freq='M') - 1).strftime('%Y-%m')
+
+
 # Example config
 # {
 #     "columns": [
@@ -49,14 +49,22 @@ LOCAL_LOCATION = os.environ['LOCAL_LOCATION']
 
 class RetriveDataset():
 
-    def __init__(self, symbol, date, config, recompile=False, load_source="local"):
+    def __init__(self, symbol, date, config, recompile=False, load_source="local", stream_reduce=True, reduce_engine="numpy", warm_up=None):
         print("=== RetriveDataset ===")
         print("> Initializing RetriveDataset...")
         print(f"> Symbol: {symbol}")
         print(f"> Date: {date}")
 
         self.aggregation_window = '1S'
+        # Recomputes feature columns instead of loading them from the feature store
         self.recompile = recompile
+        # Reduces agg trades chunk by chunk instead of loading the full month
+        self.stream_reduce = stream_reduce
+        # Engine for the in-memory path, see reduce_trades.REDUCE_ENGINES
+        self.reduce_engine = reduce_engine
+        # Rows from the end of the month before, e.g. '1H', that features are
+        # computed over so rolling windows carry across the month boundary
+        self.warm_up = None if warm_up is None else pd.Timedelta(warm_up)
         self.config = config
 
         self.data_type = "aggTrades"
@@ -64,114 +72,197 @@ class RetriveDataset():
         self.date = date
         self.interval = "monthly"
         self.load_source = load_source
-        self.reduced_trades_filepath = f"reduced_trades/{self.interval}/{symbol}/{symbol}-reduced-{self.aggregation_window}-{self.data_type}-{date}.csv"
-        self.agg_trades_filepath = f"aggTrades/{self.interval}/{symbol}/{symbol}-aggTrades-{date}.csv"
+        self.reduced_trades_filepath = self.reduced_trades_path(self.aggregation_window)
+        self.reduced_trades_pyramid = {}
+        self.agg_trades_filepath = with_format_extension(f"aggTrades/{self.interval}/{symbol}/{symbol}-aggTrades-{date}.csv")
         self.local_trading_dataset_filepath = f"local/data/{self.symbol}/trading_dataset_{self.date}.csv"
-        self.trading_dataset_filepath = f"trading_datasets/{self.symbol}/trading_dataset_{self.date}.csv"
 
-        with open(f"{LOCAL_LOCATION}/recompile_zscore.json", "r") as f:
-            self.recompile_zscore = json.load(f)
+
+    def reduced_trades_path(self, resolution, date=None):
+        date = self.date if date is None else date
+        return with_format_extension(f"reduced_trades/{self.interval}/{self.symbol}/{self.symbol}-reduced-{resolution}-{self.data_type}-{date}.csv")
     
     
     def retrieve_trading_dataset(self):
-        
-        trading_dataset_df = self.__retrieve_from_blob(self.trading_dataset_filepath, retrieve_type="trading dataset")
-        
-        if trading_dataset_df is None:
-            trading_dataset_df = self.retrieve_reduced_trades()
-            # Happens when could not build
-            if trading_dataset_df is None:
-                print("> Could not retrieve reduced trades")
-                return None
 
-        if "signal" in trading_dataset_df.columns:      
-            trading_dataset_df = trading_dataset_df.drop(columns=['signal'])
+        trading_dataset_df = self.retrieve_reduced_trades()
+        # Happens when could not build
+        if trading_dataset_df is None:
+            print("> Could not retrieve reduced trades")
+            return None
 
         if len(set(self.config["columns"]) - set(trading_dataset_df.columns)) > 0:
             print(f"> Columns {set(self.config['columns']) - set(trading_dataset_df.columns)} missing from trading dataset")
             raise Exception("Columns missing from trading dataset")
-        
-        needed_columns = self.config["columns"]
-        
-        added_column = False
-        
-        if "features" in self.config:
-            for feature in self.config["features"]:
-                feature_type = feature['type']
-
-                # Add feature types here:
-                if feature_type == "zscore":
-                    for column in feature["columns"]:
-                        dataset_column = f"{column}_{feature_type}"
-                        needed_columns.append(dataset_column)
-                        # Build new column if doesn't exist 
-                        if dataset_column not in trading_dataset_df.columns or self.symbol not in self.recompile_zscore:
-                            trading_dataset_df = self.add_zscore(column, trading_dataset_df)    
-                            added_column = True
-
-                
-                if feature_type == "news_signal":
-                    dataset_column = "news_signal"
-                    needed_columns.append(dataset_column)
-
-                    if dataset_column not in trading_dataset_df.columns:
-                        trading_dataset_df = self.add_news_signals(trading_dataset_df)
-                        added_column = True
-
-                if feature_type == "future_diff":
-                    for period in feature["periods"]:
-                        for column in feature["columns"]:
-                            dataset_column = f"{column}_{feature_type}_{period}"
-                            needed_columns.append(dataset_column)
-
-                            if dataset_column not in trading_dataset_df.columns:
-                                trading_dataset_df[dataset_column] = -round(trading_dataset_df[column].pct_change(periods=-period), 4)
-                                added_column = True
-                
-                if feature_type == "moving_average":
-                    for period in feature["periods"]:
-                        for column in feature["columns"]:
-                            dataset_column = f"{column}_{feature_type}_MA_{period}"
-                            needed_columns.append(dataset_column)
-
-                            if dataset_column not in trading_dataset_df.columns:
-                                trading_dataset_df[dataset_column] = round(trading_dataset_df[column].fillna(0).rolling(period).mean(), 2)
-                                added_column = True
-
-                if feature_type == "ratio":
-                    dataset_column = feature["column_name"]
-                    needed_columns.append(dataset_column)
-
-                    if dataset_column not in trading_dataset_df.columns:
-                        print(f"> Adding ratio column {dataset_column}")
-                        numerator = feature["columns"][0]
-                        denominator = feature["columns"][1]
-                        trading_dataset_df[dataset_column] = round(trading_dataset_df[numerator] / trading_dataset_df[denominator], 6)
-                        added_column = True
-                    
-
-            if added_column:
-                self.__save_to_blob(trading_dataset_df, self.trading_dataset_filepath)
+
+        needed_columns = list(self.config["columns"])
+        month_start = trading_dataset_df.index[0]
+
+        warm_up_df = self.__retrieve_warm_up(month_start)
+        if warm_up_df is not None:
+            print(f"> Warming up features with {len(warm_up_df)} rows from {previous_month(self.date)}")
+            trading_dataset_df = pd.concat([warm_up_df, trading_dataset_df])
+        elif self.warm_up is not None:
+            print(f"> Nothing of {self.symbol}-{previous_month(self.date)} to warm up from, features start cold")
+
+        # Feature columns are stored one per blob against the reduced trades they came from
+        self.feature_store = FeatureStore(self.symbol, self.date, self.__feature_base_version(), self.interval, self.__feature_sources())
+
+        # Features are computed in dependency order so they can be listed in any order
+        feature_graph = FeatureGraph(self.config.get("features", []))
+
+        for node in feature_graph.ordered_nodes(trading_dataset_df.columns):
+            trading_dataset_df = self.__add_feature_column(trading_dataset_df, node)
+        needed_columns += feature_graph.columns
 
         if "signal_function" in self.config:
             singal_func = self.config["signal_function"]
             trading_dataset_df = singal_func(trading_dataset_df)
             needed_columns.append("signal")
 
-        trading_dataset_df = trading_dataset_df[needed_columns]
+        trading_dataset_df = trading_dataset_df.loc[month_start:, needed_columns]
         
         trading_dataset_df.replace([float('inf'), float('-inf'), float('nan')], 0, inplace=True)
         trading_dataset_df.index = pd.to_datetime(trading_dataset_df.index)
+        # The warm-up the features actually had, None when they started cold
+        trading_dataset_df.attrs["warm_up"] = None if warm_up_df is None else str(self.warm_up)
 
-        self.recompile_zscore.append(self.symbol)
+        return trading_dataset_df
 
-        with open(f"{LOCAL_LOCATION}/recompile_zscore.json", "w") as f:
-            json.dump(self.recompile_zscore, f)
 
-        return trading_dataset_df
-    
+    def retrieve_event_windows(self, event_times, before=pd.Timedelta(minutes=10), after=pd.Timedelta(minutes=60), columns=None):
+        # Rows of the trading dataset from before to after each event, e.g. news
+        # times, as an events x rows x columns array. Only the parts of the
+        # stored reduced trades and feature columns the windows fall in are
+        # read, rows outside the month are NaN. Returns the array, the offset
+        # of each row from its event and the column names.
+        feature_graph = FeatureGraph(self.config.get("features", []))
+        if columns is None:
+            columns = list(self.config["columns"]) + feature_graph.columns
+        feature_nodes = [feature_graph.nodes[column] for column in columns if column in feature_graph.nodes]
+
+        storage = get_storage()
+        column_paths = self.__stored_column_paths(feature_nodes)
+
+        # Windows are read from the stored columns, so anything missing is built once for the month
+        if self.recompile or column_paths is None or not all(storage.exists(path) for path in column_paths.values()):
+            print("> Building trading dataset before reading event windows...")
+            if self.retrieve_trading_dataset() is None:
+                return None
+            column_paths = self.__stored_column_paths(feature_nodes)
+
+        event_times = pd.DatetimeIndex(event_times).floor(self.aggregation_window)
+        offsets = pd.timedelta_range(-before, after, freq=self.aggregation_window)
+        windows = [(event_time - before, event_time + after) for event_time in event_times]
+        print(f"> Reading {len(windows)} event windows for {self.symbol}-{self.date}")
+
+        base_columns = [column for column in columns if column not in feature_graph.nodes]
+        window_dfs = [read_storage_windows(storage, column_paths[None], windows, base_columns)]
+        for node in feature_nodes:
+            feature_df = read_storage_windows(storage, column_paths[node.column], windows, [node.store_column])
+            window_dfs.append(feature_df.rename(columns={node.store_column: node.column}))
+
+        windows_df = pd.concat(window_dfs, axis=1)[columns]
+        windows_df = windows_df.replace([float('inf'), float('-inf'), float('nan')], 0)
+
+        # Position of each event's rows in windows_df, -1 where there is no row
+        rows = windows_df.index.get_indexer((event_times.values[:, None] + offsets.values[None, :]).ravel())
+        event_windows = np.full((len(rows), len(columns)), np.nan)
+        event_windows[rows >= 0] = windows_df.to_numpy(dtype=np.float64)[rows[rows >= 0]]
+
+        return event_windows.reshape(len(event_times), len(offsets), len(columns)), offsets, columns
+
+
+    def __stored_column_paths(self, feature_nodes):
+        # Blob holding each feature column, and the reduced trades under None
+        reduced_trades_filepath = self.__stored_path(self.reduced_trades_filepath)
+        if reduced_trades_filepath is None:
+            return None
+
+        feature_store = FeatureStore(self.symbol, self.date, self.__feature_base_version(), self.interval)
+        column_paths = {node.column: feature_store.column_path(node.store_column, node.spec) for node in feature_nodes}
+        column_paths[None] = reduced_trades_filepath
+        return column_paths
+
+
+    def __previous_reduced_trades_path(self):
+        # Stored reduced trades of the month before, when warming up from them
+        if self.warm_up is None:
+            return None
+
+        return self.__stored_path(self.reduced_trades_path(self.aggregation_window, previous_month(self.date)))
+
+
+    def __retrieve_warm_up(self, month_start):
+        # Only reads the row groups of the month before that the warm-up falls in.
+        # The month before is built when it isn't stored, a month without its
+        # agg trades starts cold.
+        if self.warm_up is None:
+            return None
+
+        if self.__previous_reduced_trades_path() is None:
+            print(f"> Building reduced trades of {previous_month(self.date)} to warm up from")
+            previous_retriever = RetriveDataset(
+                self.symbol, previous_month(self.date), self.config,
+                stream_reduce=self.stream_reduce, reduce_engine=self.reduce_engine
+            )
+            previous_retriever.retrieve_reduced_trades()
+
+        previous_dataset_path = self.__previous_reduced_trades_path()
+        if previous_dataset_path is None:
+            return None
+
+        warm_up_end = month_start - pd.Timedelta(self.aggregation_window)
+        warm_up_df = read_storage_windows(get_storage(), previous_dataset_path, [(month_start - self.warm_up, warm_up_end)])
+        if len(warm_up_df) == 0:
+            return None
+
+        return warm_up_df
+
+
+    def __feature_base_version(self):
+        # Features computed over a warm-up also depend on the month before
+        base_version = self.__blob_version(self.reduced_trades_filepath)
+        previous_dataset_path = self.__previous_reduced_trades_path()
+        if previous_dataset_path is None:
+            return base_version
+
+        return f"{base_version}+{get_storage().version(previous_dataset_path)}-{self.warm_up}"
+
+
+    def __feature_sources(self):
+        # Blobs the features are computed from and their versions, see FeatureStore
+        sources = {}
+        for source_path in [self.__stored_path(self.reduced_trades_filepath), self.__previous_reduced_trades_path()]:
+            if source_path is not None:
+                sources[source_path] = get_storage().version(source_path)
+
+        return sources
+
+
+    def __add_feature_column(self, df, node):
+        # Loads the column from the feature store, or computes it and stores just that column
+        if node.column in df.columns:
+            return df
+
+        if not self.recompile:
+            column = self.feature_store.load(node.store_column, node.spec)
+            if column is not None:
+                df[node.column] = column
+                return df
+
+        print(f"> Computing {node.column}...")
+        df[node.column] = node.compute(df, self)
+        self.feature_store.save(node.store_column, node.spec, df[node.column])
+
+        return df
+
+
+    def retrieve_reduced_trades(self, resolution=None):
+        # resolution picks a coarser level of the pyramid, e.g. '1min'
+        if resolution is not None and resolution != self.aggregation_window:
+            return self.__retrieve_reduced_trades_pyramid(resolution)
 
-    def retrieve_reduced_trades(self):
         print("> Retrieving reduced trades...")
         reduced_trades_df = self.__retrieve_from_blob(self.reduced_trades_filepath, retrieve_type="reduced trades")
 
@@ -185,34 +276,87 @@ class RetriveDataset():
             print(f"> Retrieved reduced trades from blob for {self.symbol}-{self.date}")
 
         return reduced_trades_df
-    
+
+
+    def __retrieve_reduced_trades_pyramid(self, resolution):
+        print(f"> Retrieving {resolution} reduced trades...")
+        reduced_trades_df = self.__retrieve_from_blob(self.reduced_trades_path(resolution), retrieve_type=f"{resolution} reduced trades")
+
+        if reduced_trades_df is not None:
+            return reduced_trades_df
+
+        if resolution not in PYRAMID_RESOLUTIONS:
+            print(f"> {resolution} is not one of the pyramid resolutions {PYRAMID_RESOLUTIONS}")
+            return None
+
+        # Rebuilding from agg trades writes every level, and the 1s trades if they're missing
+        print(f"> Building reduced trades pyramid for {self.symbol}-{self.date}")
+        base_reduced_trades_df = self.__stream_reduce_trades()
+        if base_reduced_trades_df is None:
+            return None
+
+        if not get_storage().exists(self.reduced_trades_filepath):
+            self.__save_to_blob(base_reduced_trades_df, self.reduced_trades_filepath)
+
+        return self.reduced_trades_pyramid[resolution]
+
 
     def __build_reduced_trades(self):
         print("> Building reduced trades...")
+
+        if self.stream_reduce:
+            return self.__stream_reduce_trades()
+
         agg_trades_df = self.get_agg_trades()
 
         if agg_trades_df is None:
             print("> Could not build reduced trades. Agg trades is does not exist")
             return None
         
-        reduced_trades_df = self.__reduce_trades(agg_trades_df)
+        reduced_trades_df = reduce_trades(agg_trades_df, self.date, self.aggregation_window, engine=self.reduce_engine)
+
+        if reduced_trades_df is None:
+            print("> Could not build reduced trades")
+            return None
+
+        return reduced_trades_df
+
+
+    def __stream_reduce_trades(self):
+        agg_trades_chunks = self.__stream_from_blob(self.agg_trades_filepath, "agg trades")
+
+        if agg_trades_chunks is None:
+            print("> Retrieving agg trades from binance...")
+            retrieve_agg_trades(self.symbol, self.date, self.interval)
+            agg_trades_chunks = self.__stream_from_blob(self.agg_trades_filepath, "agg trades")
+
+        if agg_trades_chunks is None:
+            print("> Could not build reduced trades. Agg trades is does not exist")
+            return None
+
+        reducer = stream_reduce_trades(agg_trades_chunks, self.date, self.aggregation_window, exact=self.reduce_engine != "bincount")
+        reduced_trades_df = reducer.to_frame()
 
         if reduced_trades_df is None:
             print("> Could not build reduced trades")
             return None
 
+        # The coarser levels come from the same pass and are stored next to the 1s trades
+        self.reduced_trades_pyramid = reducer.to_pyramid(PYRAMID_RESOLUTIONS)
+        for resolution, pyramid_df in self.reduced_trades_pyramid.items():
+            print(f"> Saving {resolution} reduced trades")
+            self.__save_to_blob(pyramid_df, self.reduced_trades_path(resolution))
+
         return reduced_trades_df
 
 
     def __save_to_blob(self, df, filepath, local=False):
         print("> Saving to blob...")
 
-        csv_data = io.StringIO()
-        df.to_csv(csv_data)  # Set index to True if you want to include the DataFrame's index in the CSV
-        csv_data.seek(0)
+        data = serialise_df(df)
 
-        blob_client = BLOB_SERVICE_CLIENT.get_blob_client(container=CONTAINER_NAME, blob=filepath)
-        blob_client.upload_blob(csv_data.getvalue(), overwrite=True)  # Set overwrite to True if you want to replace an existing blob
+        # Overwrites any existing blob, the cached copy is replaced along with it
+        get_storage().put(filepath, data)
 
 
     def get_agg_trades(self):
@@ -258,11 +402,12 @@ class RetriveDataset():
         print(f"> Retrieving news from {start_time} to {end_time}...")
 
         news_class = GetCryptoNews(start_time, end_time, symbol=self.symbol)
-        news_class.filter_news()
-        news_df = news_class.create_news_df()
+        news_seconds = news_class.news_seconds()
+        print(f"> {len(news_seconds)} seconds with news")
 
+        # Set on the rows they fall on, rather than merging a frame of every second
         df.index = pd.to_datetime(df.index)
-        df = pd.merge(df, news_df, left_index=True, right_index=True, how='outer')
+        df['news_signal'] = news_signal(df.index, news_seconds)
 
         return df
 
@@ -293,93 +438,56 @@ class RetriveDataset():
     def add_zscore(self, column, df, window='1H'):
         print(f"> Adding column-wise z-scores for {column}...")
 
-        # Compute means and standard deviations
-        # Compute rolling means and standard deviations
-        rolling_mean = df[column].fillna(0).rolling(window=window).mean().shift(1)
-        rolling_std = df[column].fillna(0).rolling(window=window).std().shift(1)
-        
-        df[f'{column}_zscore'] = round((df[column] - rolling_mean) / rolling_std, 2)
+        df[f'{column}_zscore'] = round(rolling_zscore(df[column], window), 2)
 
         return df
 
 
-    def __reduce_trades(self, agg_trades_df):
-
-        if agg_trades_df is None:
-            print("No trades to reduce")
-            return None
-
-        # Check if 'transact_time' is not already a datetime object
-        if not isinstance(agg_trades_df['transact_time'].iloc[0], pd.Timestamp):
-            # Convert transact_time to datetime
-            agg_trades_df['transact_time'] = pd.to_datetime(agg_trades_df['transact_time'], unit='ms')
-
-        # Round transact_time to the nearest second
-        agg_trades_df['floored_time'] = agg_trades_df['transact_time'].dt.floor(self.aggregation_window)
+    def __retrieve_from_blob(self, blob_file_path, retrieve_type=""):
+        print(f"> Attempting to retrieve {retrieve_type} from blob...")
 
-        # Calculate the number of trades for each row
-        agg_trades_df['num_trades'] = agg_trades_df['last_trade_id'] - agg_trades_df['first_trade_id'] + 1
+        # Falls back to the legacy CSV blob if the columnar one hasn't been written yet
+        for file_path in dict.fromkeys([blob_file_path, legacy_csv_path(blob_file_path)]):
+            try:
+                # Download the blob content, or read it from the local cache
+                data = get_storage().get(file_path)
+                # Agg trades are indexed by trade id, everything else by time
+                return deserialise_df(data, parse_dates=retrieve_type != "agg trades")
 
-        # Compute average price for all transactions
-        overall_avg_price = agg_trades_df.groupby('floored_time')['price'].mean()
+            except StorageNotFoundError:
+                continue
 
-        # Split dataframe for buys and sells
-        buys = agg_trades_df[agg_trades_df['is_buyer_maker']]
-        sells = agg_trades_df[~agg_trades_df['is_buyer_maker']]
+        print(f"> {retrieve_type} does not exist in blob")
+        return None
 
-        # Reduce separately for buy and sell
-        buy_agg = buys.groupby('floored_time').agg(
-            sum_asset_bought=('quantity', 'sum'),
-            num_of_trades_bought=('num_trades', 'sum')
-        )
 
-        sell_agg = sells.groupby('floored_time').agg(
-            sum_asset_sold=('quantity', 'sum'),
-            num_of_trades_sold=('num_trades', 'sum')
-        )
+    def __blob_version(self, blob_file_path):
+        for file_path in dict.fromkeys([blob_file_path, legacy_csv_path(blob_file_path)]):
+            try:
+                return get_storage().version(file_path)
+            except StorageNotFoundError:
+                continue
 
-        # Merge on the floored_time
-        agg_df = pd.merge(overall_avg_price, buy_agg, on='floored_time', how='outer')
-        agg_df = pd.merge(agg_df, sell_agg, on='floored_time', how='outer').reset_index()
+        return None
 
-        # Round off float columns to desired precision
-        precision = 2  # Change this as per your requirement
-        agg_df = agg_df.round({'sum_asset_bought': precision, 'sum_asset_sold': precision})
-        agg_df = agg_df.round({'price': 6})
 
-        # Rename the price column to avg_price
-        agg_df.rename(columns={'price': 'avg_price'}, inplace=True)
+    def __stored_path(self, blob_file_path):
+        # The columnar blob, or the legacy CSV one when only that has been written
+        storage = get_storage()
+        for file_path in dict.fromkeys([blob_file_path, legacy_csv_path(blob_file_path)]):
+            if storage.exists(file_path):
+                return file_path
 
-        # Set index to floored_time
-        agg_df.index = pd.to_datetime(agg_df.floored_time)
-        
-        # Drop the floored_time column
-        agg_df.drop('floored_time', axis=1, inplace=True)
+        return None
 
-        # Fill forward avg price values
-        agg_df = agg_df.resample('1S').first()
 
-        agg_df['avg_price'] = agg_df['avg_price'].ffill()
+    def __stream_from_blob(self, blob_file_path, retrieve_type=""):
+        print(f"> Attempting to stream {retrieve_type} from blob...")
+        storage = get_storage()
 
-        return agg_df
-
-   
-    def __retrieve_from_blob(self, blob_file_path, retrieve_type=""):
-        print(f"> Attempting to retrieve {retrieve_type} from blob...")
-        try:
-            retrieve_file = BLOB_SERVICE_CLIENT.get_blob_client(container=CONTAINER_NAME, blob=blob_file_path)    
-                    
-            # Download the blob content
-            blob_data = retrieve_file.download_blob()
-            data = blob_data.readall()
-            # Bit of a hack
-            if retrieve_type == "trading dataset":
-                df = pd.read_csv(io.BytesIO(data), index_col=0, parse_dates=True)
-            else:
-                df = pd.read_csv(io.BytesIO(data), index_col=0)
-            return df
-        
-        except ResourceNotFoundError:
-            print(f"> {retrieve_type} does not exist in blob")
-            return None
+        for file_path in dict.fromkeys([blob_file_path, legacy_csv_path(blob_file_path)]):
+            if storage.exists(file_path):
+                return iter_df_chunks(storage, file_path, REDUCE_CHUNK_SIZE)
 
+        print(f"> {retrieve_type} does not exist in blob")
+        return None
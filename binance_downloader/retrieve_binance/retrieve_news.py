@@ -2,11 +2,13 @@
 import requests 
 import json
 import os
+import re
 import time
 from datetime import datetime, timezone 
 import pandas as pd
 import numpy
 from dotenv import load_dotenv
+from retrieve_binance.news_store import get_news_cache
 
 load_dotenv()
 
@@ -14,7 +16,10 @@ LOCAL_LOCATION = os.getenv("LOCAL_LOCATION")
 if LOCAL_LOCATION == None:
     raise Exception("> retrieve_news: LOCAL_LOCATION not set. Please make .env file with LOCAL_LOCATION filepath")
 
-NEWS_API_ENDPOINT = "https://news.treeofalpha.com/api"
+NEWS_API_ENDPOINT = os.getenv("NEWS_API_ENDPOINT", "https://news.treeofalpha.com/api")
+# Seconds between syncs, and how many of the latest news a sync asks for
+NEWS_SYNC_INTERVAL = int(os.getenv("NEWS_SYNC_INTERVAL", 60 * 60 * 24))
+NEWS_SYNC_LIMIT = int(os.getenv("NEWS_SYNC_LIMIT", 2000))
 
 class GetCryptoNews():
 
@@ -28,92 +33,126 @@ class GetCryptoNews():
         self.symbol_set = set()
         self.news_location = LOCAL_LOCATION
 
-        self.news = self.__load_news()
+        # News are looked up in the process' news cache, see news_store.py
+        self.news_cache = self.__load_news()
+        self.news = []
+        self.news_times = numpy.array([], dtype=numpy.int64)
 
     
     def filter_news(self):
-        print(f"> Filtered news: {len(self.news)}")
-        self.news = self.__filter_news_by_time(self.news)
-
-        print(f"> Filtered news: {len(self.news)}")
-        self.news = self.__filter_news_by_symbol(self.news)
+        # News for the symbol in the time range
+        self.news_times, news_numbers = self.news_cache.symbol_news(self.symbol, self.start_timestamp, self.end_timestamp)
+        self.news = self.news_cache.news_store.news_items(news_numbers)
 
         print(f"> Filtered news: {len(self.news)}")
 
         return self.news
 
 
-    def __filter_news_by_symbol(self, news):
-        filtered_news = []
-
-        target_suggestion_symbol = self.symbol.replace("_", "")
-
-        for news_item in news:
-
-            if 'symbols' in news_item and self.symbol in news_item['symbols']:
-                filtered_news.append(news_item)
-
-            if 'suggestions' in news_item:
-                for suggestion in news_item['suggestions']:
-                    for suggestion_symbol in suggestion['symbols']:
-                        if suggestion_symbol['symbol'] == target_suggestion_symbol:
-                            filtered_news.append(news_item)
-                            break
-                       
-
-        return filtered_news
+    def news_seconds(self):
+        # Sparse form of the symbol's news in the time range, the sorted epoch
+        # seconds they're at. Doesn't read the news items.
+        news_times, _ = self.news_cache.symbol_news(self.symbol, self.start_timestamp, self.end_timestamp)
+        return numpy.unique(news_times // 1000)
     
 
     def create_news_df(self):
-        # Create index from start to end time
+        # Dense news_signal of the filtered news every second from start to end time,
+        # news_signal sets it straight into an existing index instead
         index = pd.date_range(start= pd.to_datetime(self.start_timestamp, unit='ms'), end=pd.to_datetime(self.end_timestamp, unit='ms'), freq='1s')
         news_df = pd.DataFrame(index=index)
-        
-        news_times = [pd.to_datetime(int(news_item['time']/1000), unit='s') for news_item in self.news] 
 
-        news_df['news_signal'] = 0
-        news_df.loc[news_times, 'news_signal'] = 1
+        news_df['news_signal'] = news_signal(index, numpy.unique(self.news_times // 1000))
 
         return news_df
 
     
 
-    def __filter_news_by_time(self, news):
-        return [news_item for news_item in news if self.start_timestamp <= news_item['time'] <= self.end_timestamp]
-
     def __load_news(self):
+        return load_news_cache(self.news_location)
 
-        current_timestamp = int(time.time())
-        if not os.path.exists(f"{self.news_location}/news/"):
-            os.makedirs(f"{self.news_location}/news", exist_ok=True)
-            self.__retrieve_news()
-        
-        else:
-            has_all_news = [f if 'all_news' in f else None for f in os.listdir(f"{self.news_location}/news")]
 
-            if len(has_all_news) > 0:
-                last_updated = int(has_all_news[0].split("_")[2].replace(".json", ""))
+def load_news_cache(news_location=LOCAL_LOCATION):
+    # The process' news cache, synced with the news API when it's due. Call
+    # before forking workers so they share the cache and don't each sync.
+    news_cache = get_news_cache()
+    news_store = news_cache.news_store
 
-                if current_timestamp - last_updated > 60 * 60 * 24:
-                    self.__retrieve_news()
-        
-        has_all_news = [f if 'all_news' in f else None for f in os.listdir(f"{self.news_location}/news")]
+    # A store from before syncing starts from the newest news dump
+    if news_store.count() == 0:
+        import_news_dump(news_store, f"{news_location}/news")
 
-        with open(f"{self.news_location}/news/{has_all_news[0]}", "r") as f:
-            return json.load(f)
-        
+    last_synced = news_store.last_synced
+    if last_synced is None or int(time.time()) - last_synced > NEWS_SYNC_INTERVAL:
+        sync_news(news_store)
 
-    def __retrieve_news(self):
-        url = f"{NEWS_API_ENDPOINT}/allNews"
-        response = requests.get(url)
-        current_timestamp = int(time.time())
+    # Also picks up syncs by other processes
+    news_cache.refresh_if_changed()
+    return news_cache
 
-        with open(f"{self.news_location}/news/all_news_{current_timestamp}.json", "w") as f:
-            json.dump(response.json(), f, indent=4)
 
-        return response.json()
-    
+def import_news_dump(news_store, news_folder):
+    if not os.path.exists(news_folder):
+        return
+
+    # all_news_{timestamp}.json, the newest one has everything the others do
+    news_dumps = sorted(f for f in os.listdir(news_folder) if re.match(r"all_news_\d+\.json$", f))
+    if len(news_dumps) == 0:
+        return
+
+    news_dump = max(news_dumps, key=lambda f: int(f.split("_")[2].replace(".json", "")))
+    print(f"> Importing {news_dump}")
+    with open(f"{news_folder}/{news_dump}", "r") as f:
+        news_store.merge(json.load(f))
+
+    news_store.set_last_synced(int(news_dump.split("_")[2].replace(".json", "")))
+
+
+def news_signal(index, news_seconds):
+    # 1 on the rows of index, a sorted DatetimeIndex, that are at one of
+    # news_seconds, 0 elsewhere. One binary search per news.
+    timestamps = pd.DatetimeIndex(index).asi8
+    news_timestamps = numpy.asarray(news_seconds, dtype=numpy.int64) * 10**9
+
+    positions = numpy.searchsorted(timestamps, news_timestamps, side='left')
+    in_index = positions < len(timestamps)
+    in_index[in_index] = timestamps[positions[in_index]] == news_timestamps[in_index]
+
+    signal = numpy.zeros(len(timestamps), dtype=numpy.int64)
+    signal[positions[in_index]] = 1
+    return signal
+
+
+def request_news(path, params=None):
+    response = requests.get(f"{NEWS_API_ENDPOINT}/{path}", params=params)
+    if response.status_code != 200:
+        raise Exception(f"> retrieve_news: {path} returned {response.status_code}")
+
+    return response.json()
+
+
+def sync_news(news_store):
+    # Merges the news newer than the newest stored into the store. All the news
+    # are retrieved when it's empty, or when the latest news don't reach back
+    # to it, as some would be missed.
+    newest_time = news_store.newest_time()
+    news = None
+
+    if newest_time is not None:
+        print(f"> Syncing news since {datetime.fromtimestamp(newest_time / 1000, tz=timezone.utc)}...")
+        latest_news = request_news("news", {"limit": NEWS_SYNC_LIMIT})
 
+        # Items at the newest time may have been stored already, merge replaces them by id
+        news = [news_item for news_item in latest_news if news_item.get("time", 0) >= newest_time]
+        if len(news) == len(latest_news) and len(latest_news) > 0:
+            print("> Latest news don't reach the stored news")
+            news = None
 
+    if news is None:
+        print("> Retrieving all news...")
+        news = request_news("allNews")
 
+    news_store.merge(news)
+    news_store.set_last_synced(int(time.time()))
 
+    return news_store
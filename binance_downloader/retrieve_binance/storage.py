@@ -0,0 +1,269 @@
+import os
+import shutil
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTAINER_NAME = "binancedata"
+
+# "azure" reads and writes the blob container, "local" a directory on disk
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure")
+# Turns the local blob cache in front of the azure backend on or off
+STORAGE_CACHE = os.getenv("STORAGE_CACHE", "true").lower() == "true"
+
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024
+
+_storage = None
+
+
+class StorageNotFoundError(Exception):
+    pass
+
+
+class Storage():
+    # Interface for where datasets are kept. Paths are "/" separated and
+    # relative to the store, e.g. reduced_trades/monthly/BTCUSDT/BTCUSDT-reduced-1S-aggTrades-2023-09.parquet
+
+    def get(self, path):
+        raise NotImplementedError
+
+    def put(self, path, data):
+        # data is bytes or a binary file object. Returns the new version of the path
+        raise NotImplementedError
+
+    def exists(self, path):
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        raise NotImplementedError
+
+    def stream(self, path, chunk_size=STREAM_CHUNK_SIZE):
+        raise NotImplementedError
+
+    def get_range(self, path, offset, length):
+        # length bytes from offset, so parts of a columnar file can be read on their own
+        raise NotImplementedError
+
+    def size(self, path):
+        raise NotImplementedError
+
+    def version(self, path):
+        # Changes whenever the contents of path change (ETag for azure)
+        raise NotImplementedError
+
+    def local_path(self, path):
+        # The file of path when the store is on local disk, so it can be read in place
+        return None
+
+    def delete(self, path):
+        raise NotImplementedError
+
+
+class AzureStorage(Storage):
+
+    def __init__(self, container_name=CONTAINER_NAME, connection_string=None):
+        # Imported here so the package can be used offline without azure installed
+        from azure.storage.blob import BlobServiceClient
+        from azure.core.exceptions import ResourceNotFoundError
+
+        if connection_string is None:
+            connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+        if connection_string is None:
+            raise Exception("> storage: AZURE_STORAGE_CONNECTION_STRING not set. Please add it to the .env file or use STORAGE_BACKEND=local")
+
+        self.container_name = container_name
+        self.service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.not_found_error = ResourceNotFoundError
+
+
+    def get(self, path):
+        try:
+            return self.__blob_client(path).download_blob().readall()
+        except self.not_found_error:
+            raise StorageNotFoundError(path)
+
+
+    def put(self, path, data):
+        upload_result = self.__blob_client(path).upload_blob(data, overwrite=True)
+        return upload_result["etag"]
+
+
+    def exists(self, path):
+        return self.__blob_client(path).exists()
+
+
+    def list(self, prefix=""):
+        container_client = self.service_client.get_container_client(self.container_name)
+        for blob in container_client.list_blobs(name_starts_with=prefix):
+            yield blob.name
+
+
+    def stream(self, path, chunk_size=STREAM_CHUNK_SIZE):
+        try:
+            downloader = self.__blob_client(path).download_blob()
+        except self.not_found_error:
+            raise StorageNotFoundError(path)
+
+        # Chunk size is set by the SDK's max_chunk_get_size here
+        for chunk in downloader.chunks():
+            yield chunk
+
+
+    def get_range(self, path, offset, length):
+        try:
+            return self.__blob_client(path).download_blob(offset=offset, length=length).readall()
+        except self.not_found_error:
+            raise StorageNotFoundError(path)
+
+
+    def size(self, path):
+        try:
+            return self.__blob_client(path).get_blob_properties().size
+        except self.not_found_error:
+            raise StorageNotFoundError(path)
+
+
+    def version(self, path):
+        try:
+            return self.__blob_client(path).get_blob_properties().etag
+        except self.not_found_error:
+            raise StorageNotFoundError(path)
+
+
+    def delete(self, path):
+        try:
+            self.__blob_client(path).delete_blob()
+        except self.not_found_error:
+            raise StorageNotFoundError(path)
+
+
+    def __blob_client(self, path):
+        return self.service_client.get_blob_client(container=self.container_name, blob=path)
+
+
+class LocalStorage(Storage):
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+
+    def get(self, path):
+        try:
+            with open(self.__local_path(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise StorageNotFoundError(path)
+
+
+    def put(self, path, data):
+        local_path = self.__local_path(path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        # Written to a temp file first so readers never see half a file, named
+        # per process and thread so concurrent puts of a path don't share one
+        tmp_path = f"{local_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f)
+        os.replace(tmp_path, local_path)
+
+        return self.version(path)
+
+
+    def exists(self, path):
+        return os.path.isfile(self.__local_path(path))
+
+
+    def list(self, prefix=""):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                path = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if path.startswith(prefix) and not path.endswith(".tmp"):
+                    yield path
+
+
+    def stream(self, path, chunk_size=STREAM_CHUNK_SIZE):
+        try:
+            f = open(self.__local_path(path), "rb")
+        except FileNotFoundError:
+            raise StorageNotFoundError(path)
+
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+    def get_range(self, path, offset, length):
+        try:
+            with open(self.__local_path(path), "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        except FileNotFoundError:
+            raise StorageNotFoundError(path)
+
+
+    def size(self, path):
+        try:
+            return os.path.getsize(self.__local_path(path))
+        except FileNotFoundError:
+            raise StorageNotFoundError(path)
+
+
+    def version(self, path):
+        try:
+            stat = os.stat(self.__local_path(path))
+        except FileNotFoundError:
+            raise StorageNotFoundError(path)
+
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+    def local_path(self, path):
+        return self.__local_path(path)
+
+
+    def delete(self, path):
+        try:
+            os.remove(self.__local_path(path))
+        except FileNotFoundError:
+            raise StorageNotFoundError(path)
+
+
+    def __local_path(self, path):
+        return os.path.join(self.root, *path.split("/"))
+
+
+def get_storage():
+    # Built on first use so nothing touches the network at import time
+    global _storage
+
+    if _storage is not None:
+        return _storage
+
+    if STORAGE_BACKEND == "azure":
+        _storage = AzureStorage()
+        if STORAGE_CACHE:
+            from retrieve_binance.blob_cache import CachedStorage
+            _storage = CachedStorage(_storage)
+
+    elif STORAGE_BACKEND == "local":
+        local_location = os.getenv("LOCAL_LOCATION")
+        _storage = LocalStorage(os.getenv("STORAGE_LOCAL_ROOT", f"{local_location}/storage"))
+
+    else:
+        raise Exception(f"> storage: Unknown STORAGE_BACKEND {STORAGE_BACKEND}")
+
+    return _storage
+
+
+def set_storage(storage):
+    # Swaps the store used by the pipeline, e.g. a LocalStorage for benchmarks
+    global _storage
+    _storage = storage
@@ -0,0 +1,266 @@
+import io
+import os
+import json
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from retrieve_binance.storage import STREAM_CHUNK_SIZE
+
+load_dotenv()
+
+# Format used when writing reduced trades, trading datasets and agg trades.
+# Reading always sniffs the payload so legacy CSV blobs keep working.
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "parquet")
+
+# Rows per parquet row group, 4 hours of 1s rows. Reading the rows around an
+# event only decodes the row groups they fall in, see read_storage_windows.
+PARQUET_ROW_GROUP_SIZE = int(os.getenv("PARQUET_ROW_GROUP_SIZE", 4 * 60 * 60))
+
+FORMAT_EXTENSIONS = {
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "csv": ".csv",
+}
+
+# Bytes of CSV parsed at a time when converting a file, see convert_csv_file
+CSV_BLOCK_SIZE = 64 * 1024 ** 2
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_MAGIC = b"ARROW1"
+
+
+def with_format_extension(filepath, storage_format=STORAGE_FORMAT):
+    if storage_format not in FORMAT_EXTENSIONS:
+        raise Exception(f"Unknown storage format {storage_format}")
+
+    root, _ = os.path.splitext(filepath)
+    return f"{root}{FORMAT_EXTENSIONS[storage_format]}"
+
+
+def legacy_csv_path(filepath):
+    return with_format_extension(filepath, "csv")
+
+
+def detect_format(data):
+    if data[:4] == PARQUET_MAGIC:
+        return "parquet"
+    if data[:6] == ARROW_MAGIC:
+        return "feather"
+    return "csv"
+
+
+def serialise_df(df, storage_format=STORAGE_FORMAT):
+    if storage_format == "csv":
+        csv_data = io.StringIO()
+        df.to_csv(csv_data)
+        return csv_data.getvalue().encode("utf-8")
+
+    buffer = io.BytesIO()
+
+    if storage_format == "parquet":
+        df.to_parquet(buffer, engine="pyarrow", index=True, row_group_size=PARQUET_ROW_GROUP_SIZE)
+    elif storage_format == "feather":
+        # Feather can't store a non-default index so it's kept as the first column
+        index_name = df.index.name if df.index.name is not None else "index"
+        df.rename_axis(index_name).reset_index().to_feather(buffer)
+    else:
+        raise Exception(f"Unknown storage format {storage_format}")
+
+    return buffer.getvalue()
+
+
+def deserialise_df(data, parse_dates=False):
+    storage_format = detect_format(data)
+
+    if storage_format == "parquet":
+        return pd.read_parquet(io.BytesIO(data), engine="pyarrow")
+
+    if storage_format == "feather":
+        df = pd.read_feather(io.BytesIO(data))
+        df = df.set_index(df.columns[0])
+        if df.index.name == "index":
+            df.index.name = None
+        return df
+
+    # Legacy CSV blobs
+    df = pd.read_csv(io.BytesIO(data), index_col=0, parse_dates=parse_dates)
+    if parse_dates:
+        df.index = pd.to_datetime(df.index)
+    return df
+
+
+def convert_csv_file(csv_path, storage_format=STORAGE_FORMAT, converted_path=None):
+    # Writes the CSV file, indexed by its first column, to converted_path (next
+    # to it by default) in storage_format a block at a time, so the whole file is
+    # never in memory. Reads back like serialise_df of the same DataFrame. Returns its path.
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    converted_path = converted_path or with_format_extension(csv_path, storage_format)
+    reader = pa_csv.open_csv(csv_path, read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE))
+
+    if storage_format == "parquet":
+        import pyarrow.parquet as pq
+
+        # The first column is stored as the pandas index, after the others like to_parquet does
+        index_name = reader.schema.names[0]
+        empty_df = reader.schema.empty_table().to_pandas().set_index(index_name)
+        schema = pa.Schema.from_pandas(empty_df, preserve_index=True)
+
+        with pq.ParquetWriter(converted_path, schema) as writer:
+            for batch in reader:
+                table = pa.Table.from_batches([batch]).select(schema.names)
+                writer.write_table(table.replace_schema_metadata(schema.metadata), row_group_size=PARQUET_ROW_GROUP_SIZE)
+
+    elif storage_format == "feather":
+        import pyarrow.ipc as ipc
+
+        # Feather keeps the index as the first column, as it is in the CSV
+        options = ipc.IpcWriteOptions(compression="lz4")
+        with ipc.new_file(converted_path, reader.schema, options=options) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+
+    else:
+        raise Exception(f"Can't convert CSV to {storage_format}")
+
+    return converted_path
+
+
+class ChunkedByteStream(io.RawIOBase):
+    # File-like view over an iterator of byte chunks, e.g. Storage.stream
+
+    def __init__(self, byte_chunks):
+        self.byte_chunks = iter(byte_chunks)
+        self.current = b""
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.position >= len(self.current):
+            self.current = next(self.byte_chunks, None)
+            self.position = 0
+            if self.current is None:
+                self.current = b""
+                return 0
+
+        size = min(len(buffer), len(self.current) - self.position)
+        buffer[:size] = self.current[self.position:self.position + size]
+        self.position += size
+        return size
+
+
+def iter_df_chunks(storage, path, chunksize):
+    # Yields DataFrames of at most chunksize rows of a stored DataFrame without
+    # reading the whole payload at once
+    storage_format = detect_format(storage.get_range(path, 0, len(ARROW_MAGIC)))
+
+    if storage_format == "csv":
+        stream = io.BufferedReader(ChunkedByteStream(storage.stream(path)))
+        for df in pd.read_csv(stream, index_col=0, chunksize=chunksize):
+            yield df
+        return
+
+    # Columnar files need random access, so they're read in place when on local
+    # disk and by range otherwise, a batch at a time
+    local_path = storage.local_path(path)
+    if local_path is not None:
+        data = open(local_path, "rb")
+    else:
+        data = io.BufferedReader(StorageRangeFile(storage, path), buffer_size=STREAM_CHUNK_SIZE)
+
+    with data:
+        if storage_format == "parquet":
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(data).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+
+        elif storage_format == "feather":
+            import pyarrow.ipc as ipc
+
+            reader = ipc.open_file(data)
+            for i in range(reader.num_record_batches):
+                # Feather batches are written whole, up to 64k rows
+                batch = reader.get_batch(i)
+                for offset in range(0, batch.num_rows, chunksize):
+                    df = batch.slice(offset, chunksize).to_pandas()
+                    yield df.set_index(df.columns[0])
+
+
+class StorageRangeFile(io.RawIOBase):
+    # Seekable file over a stored blob that only downloads the ranges read from it
+
+    def __init__(self, storage, path):
+        self.storage = storage
+        self.path = path
+        self.blob_size = storage.size(path)
+        self.position = 0
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.blob_size
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        size = max(min(len(buffer), self.blob_size - self.position), 0)
+        if size == 0:
+            return 0
+
+        data = self.storage.get_range(self.path, self.position, size)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        self.bytes_read += len(data)
+        return len(data)
+
+
+def read_storage_windows(storage, path, windows, columns=None):
+    # Rows of a stored DataFrame with their index inside any of windows, a list
+    # of (start, end) timestamps. Parquet blobs only download the row groups
+    # the windows touch, found from the index column's min and max.
+    if detect_format(storage.get_range(path, 0, len(ARROW_MAGIC))) != "parquet":
+        df = deserialise_df(storage.get(path), parse_dates=True)
+        if columns is not None:
+            df = df[columns]
+    else:
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(StorageRangeFile(storage, path))
+        metadata = parquet_file.metadata
+        index_column = json.loads(metadata.metadata[b"pandas"])["index_columns"][0]
+        index_position = parquet_file.schema_arrow.get_field_index(index_column)
+
+        row_groups = []
+        for row_group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(row_group).column(index_position).statistics
+            if statistics is None or not statistics.has_min_max:
+                row_groups.append(row_group)
+                continue
+
+            first, last = pd.Timestamp(statistics.min), pd.Timestamp(statistics.max)
+            if any(start <= last and end >= first for start, end in windows):
+                row_groups.append(row_group)
+
+        df = parquet_file.read_row_groups(row_groups, columns=columns, use_pandas_metadata=True).to_pandas()
+
+    df.index = pd.to_datetime(df.index)
+    in_windows = np.zeros(len(df), dtype=bool)
+    for start, end in windows:
+        in_windows[df.index.searchsorted(start, side='left'):df.index.searchsorted(end, side='right')] = True
+
+    return df[in_windows]
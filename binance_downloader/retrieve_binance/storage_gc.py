@@ -0,0 +1,43 @@
+import sys
+from retrieve_binance.storage import get_storage
+from retrieve_binance.feature_store import stale_feature_paths
+
+# Deletes blobs nothing reads any more:
+#   trading_datasets/   whole trading datasets, replaced by the per column feature store
+#   features/           columns computed from reduced trades that have since changed,
+#                       or by an older FEATURE_STORE_VERSION, see stale_feature_paths
+# Usage: python -m retrieve_binance.storage_gc [--dry-run]
+
+UNUSED_PREFIXES = [
+    "trading_datasets/",
+]
+
+
+def unused_blob_paths():
+    storage = get_storage()
+
+    unused_paths = []
+    for prefix in UNUSED_PREFIXES:
+        unused_paths += list(storage.list(prefix))
+
+    return unused_paths + stale_feature_paths(storage)
+
+
+def collect_garbage(dry_run=False):
+    storage = get_storage()
+    unused_paths = unused_blob_paths()
+
+    for blob_path in unused_paths:
+        if dry_run:
+            print(f"> Would delete {blob_path}")
+            continue
+
+        storage.delete(blob_path)
+        print(f"> Deleted {blob_path}")
+
+    print(f"> {'Found' if dry_run else 'Deleted'} {len(unused_paths)} unused blobs")
+    return unused_paths
+
+
+if __name__ == "__main__":
+    collect_garbage(dry_run="--dry-run" in sys.argv[1:])
@@ -4,4 +4,8 @@ setup(
     name='retrieve_binance',
     version='0.1',
     packages=find_packages(),
+    extras_require={
+        # Compiles news-backtester's backtest_jit loop
+        'jit': ['numba'],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# retrieve_binance needs LOCAL_LOCATION set on import
+os.environ.setdefault("LOCAL_LOCATION", tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import retrieve_binance.feature_engine as feature_engine
+from retrieve_binance.benchmark_zscore import ZSCORE_COLUMNS, benchmark, synthetic_reduced_trades
+from retrieve_binance.feature_engine import rolling_zscore, rolling_zscores
+
+# The fused rolling z-score against the pandas rolling_zscore
+
+
+def expected_zscores(reduced_trades_df, window):
+    return np.column_stack([round(rolling_zscore(reduced_trades_df[column], window), 2).to_numpy() for column in ZSCORE_COLUMNS])
+
+
+def fused_zscores(reduced_trades_df, window):
+    return np.round(rolling_zscores(reduced_trades_df[ZSCORE_COLUMNS].to_numpy(), reduced_trades_df.index, window), 2)
+
+
+def test_benchmark_has_no_mismatches():
+    assert benchmark(100_000) == 0
+
+
+@pytest.mark.parametrize("window", ["1H", "10min", "1s"])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_fused_zscores_match_pandas(monkeypatch, seed, window):
+    # Small chunks so rows are processed in several
+    monkeypatch.setattr(feature_engine, "ZSCORE_CHUNK_ROWS", 5000)
+    reduced_trades_df = synthetic_reduced_trades(30_000, seed=seed)
+
+    np.testing.assert_array_equal(fused_zscores(reduced_trades_df, window), expected_zscores(reduced_trades_df, window))
+
+
+@pytest.mark.parametrize("window", ["1H", "10min"])
+def test_fused_zscores_match_pandas_with_gaps(monkeypatch, window):
+    # Missing seconds make the windows time based, and NaNs are filled with 0
+    monkeypatch.setattr(feature_engine, "ZSCORE_CHUNK_ROWS", 5000)
+    rng = np.random.default_rng(2)
+    reduced_trades_df = synthetic_reduced_trades(40_000, seed=2)
+    reduced_trades_df = reduced_trades_df[rng.random(len(reduced_trades_df)) < 0.8].copy()
+    reduced_trades_df[rng.random(reduced_trades_df.shape) < 0.02] = np.nan
+
+    np.testing.assert_array_equal(fused_zscores(reduced_trades_df, window), expected_zscores(reduced_trades_df, window))
+
+
+def test_fused_zscore_of_one_column():
+    series = synthetic_reduced_trades(10_000, seed=3)["sum_asset_sold"]
+
+    zscores = np.round(rolling_zscores(series.to_numpy(), series.index), 2)
+
+    np.testing.assert_array_equal(zscores[:, 0], round(rolling_zscore(series), 2).to_numpy())
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import retrieve_binance.storage_format as storage_format
+from retrieve_binance.migrate_storage import migrate_blob
+from retrieve_binance.storage import LocalStorage
+from retrieve_binance.storage_format import STORAGE_FORMAT, deserialise_df, serialise_df, with_format_extension
+
+# Migrated blobs read back like the CSV blob read and serialised whole
+
+AGG_TRADES = "aggTrades/monthly/AAAUSDT/AAAUSDT-aggTrades-2023-09.csv"
+REDUCED_TRADES = "reduced_trades/monthly/AAAUSDT/AAAUSDT-reduced-1S-aggTrades-2023-09.csv"
+
+pytestmark = pytest.mark.skipif(STORAGE_FORMAT == "csv", reason="STORAGE_FORMAT is csv, nothing to migrate")
+
+
+class RemoteStorage(LocalStorage):
+    # A store whose blobs can't be read in place, like azure
+
+    def local_path(self, path):
+        return None
+
+
+@pytest.fixture(params=[LocalStorage, RemoteStorage])
+def storage(request, tmp_path, monkeypatch):
+    storage = request.param(str(tmp_path / "storage"))
+    monkeypatch.setattr("retrieve_binance.storage._storage", storage)
+    # Small blocks so the trades are converted in several
+    monkeypatch.setattr(storage_format, "CSV_BLOCK_SIZE", 64 * 1024)
+    return storage
+
+
+def agg_trades_csv(num_rows=20000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "agg_trade_id": np.arange(num_rows) + 10 ** 9,
+        "price": np.round(rng.random(num_rows) * 10, 4),
+        "quantity": rng.integers(1, 1000, num_rows).astype(float),
+        "first_trade_id": np.arange(num_rows),
+        "last_trade_id": np.arange(num_rows),
+        "transact_time": 1693526400000 + np.arange(num_rows) * 10,
+        "is_buyer_maker": rng.random(num_rows) > 0.5,
+    })
+    return df.to_csv(index=False).encode()
+
+
+def reduced_trades_csv():
+    index = pd.date_range("2023-09-01", periods=100, freq="1s", name="transact_time")
+    df = pd.DataFrame({"price": np.linspace(1, 2, 100), "num_of_trades": np.arange(100)}, index=index)
+    return df.to_csv().encode()
+
+
+@pytest.mark.parametrize("csv_path, csv_data, parse_dates", [
+    (AGG_TRADES, agg_trades_csv(), False),
+    (REDUCED_TRADES, reduced_trades_csv(), True),
+])
+def test_migrate_blob(storage, csv_path, csv_data, parse_dates):
+    storage.put(csv_path, csv_data)
+    expected = deserialise_df(serialise_df(deserialise_df(csv_data, parse_dates=parse_dates)))
+
+    assert migrate_blob(csv_path, delete_csv=True)
+
+    migrated = deserialise_df(storage.get(with_format_extension(csv_path)))
+    pd.testing.assert_frame_equal(migrated, expected)
+    assert not storage.exists(csv_path)
@@ -0,0 +1,58 @@
+import pytest
+
+import retrieve_binance.news_store as news_store_module
+from retrieve_binance.news_store import NewsStore, binance_symbol, binance_symbols
+
+# Resolving the symbols news are about to Binance futures symbols
+
+
+@pytest.mark.parametrize("symbol, expected", [
+    ("APTUSDT", "APTUSDT"),
+    ("apt_usdt", "APTUSDT"),
+    ("CURVEUSDT", "CRVUSDT"),
+    ("PEPEUSDT", "1000PEPEUSDT"),
+    ("PEPE_USDT", "1000PEPEUSDT"),
+    ("1000PEPEUSDT", "1000PEPEUSDT"),
+    ("SHIBUSDT", "1000SHIBUSDT"),
+    ("1000SHIBUSDT", "1000SHIBUSDT"),
+    ("1INCHUSDT", "1INCHUSDT"),
+    ("USDT", None),
+    ("ETHBTC", None),
+])
+def test_binance_symbol(symbol, expected):
+    assert binance_symbol(symbol) == expected
+
+
+def test_binance_symbols_of_news_item():
+    news_item = {
+        "symbols": ["PEPE_USDT", "SHIB"],
+        "suggestions": [{"symbols": [
+            {"exchange": "binance-futures", "symbol": "1000SHIBUSDT"},
+            {"exchange": "binance", "symbol": "FLOKIUSDT"},
+        ]}],
+    }
+
+    assert binance_symbols(news_item) == ["1000PEPEUSDT", "1000SHIBUSDT"]
+
+
+def test_stored_news_are_resolved_again(tmp_path, monkeypatch):
+    # A store resolved before the 1000 aliases finds the news under the Binance symbol once reopened
+    db_path = str(tmp_path / "news.db")
+    news_item = {"_id": "pepe", "time": 1693526400000, "symbols": ["PEPE_USDT"]}
+
+    monkeypatch.setattr(news_store_module, "SYMBOL_ALIASES", {"CURVE": "CRV"})
+    monkeypatch.setattr(news_store_module, "NEWS_RESOLVER_VERSION", 1)
+    news_store = NewsStore(db_path)
+    news_store.merge([news_item])
+    assert news_store.symbol_news("1000PEPEUSDT", 0, 2 * 10 ** 12) == []
+    version = news_store.version
+    news_store.close()
+
+    monkeypatch.undo()
+    news_store = NewsStore(db_path)
+
+    news = news_store.symbol_news("1000PEPEUSDT", 0, 2 * 10 ** 12)
+    assert [item["_id"] for item in news] == ["pepe"]
+    assert news[0]["binance_symbols"] == ["1000PEPEUSDT"]
+    assert news_store.version == version + 1
+    news_store.close()
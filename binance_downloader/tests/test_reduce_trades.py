@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from retrieve_binance.benchmark_reduce import synthetic_agg_trades
+from retrieve_binance.reduce_trades import TradeReducer, reduce_trades, reduce_trades_pandas
+
+# The numpy reducers against the pandas one they replaced
+
+
+def agg_trades(seed):
+    # A day of busy trading with some trades either side of the month
+    agg_trades_df = synthetic_agg_trades(300_000, seed=seed)
+    day_start = pd.Timestamp("2023-09-12").value // 1_000_000
+    agg_trades_df["transact_time"] = np.sort(day_start + np.random.default_rng(seed).integers(0, 86_400_000, len(agg_trades_df)))
+
+    outside_month = agg_trades_df.iloc[:40].copy()
+    outside_month["transact_time"] = np.r_[
+        pd.Timestamp("2023-08-31 23:59:58").value // 1_000_000 + np.arange(20) * 100,
+        pd.Timestamp("2023-10-01 00:00:01").value // 1_000_000 + np.arange(20) * 100,
+    ]
+    agg_trades_df = pd.concat([outside_month.iloc[:20], agg_trades_df, outside_month.iloc[20:]])
+    return agg_trades_df.reset_index(drop=True).rename_axis("agg_trade_id")
+
+
+def expected_frame(agg_trades_df):
+    # The pandas reducer adds columns to its input
+    return reduce_trades_pandas(agg_trades_df.copy())
+
+
+def assert_close_to(reduced_df, expected):
+    # Plain sums can flip the 2dp rounding of a quantity
+    assert reduced_df.index.equals(expected.index)
+    assert list(reduced_df.columns) == list(expected.columns)
+    np.testing.assert_allclose(reduced_df.to_numpy(), expected.to_numpy(dtype=np.float64), rtol=0, atol=0.011)
+
+
+def uneven_chunks(agg_trades_df, seed):
+    # Chunk boundaries at random rows, so seconds are split across chunks
+    boundaries = np.sort(np.random.default_rng(seed).choice(np.arange(1, len(agg_trades_df)), 25, replace=False))
+    return [agg_trades_df.iloc[start:stop] for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(agg_trades_df)])]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_numpy_engine_matches_pandas(seed):
+    agg_trades_df = agg_trades(seed)
+    expected = expected_frame(agg_trades_df)
+
+    reduced_df = reduce_trades(agg_trades_df, "2023-09", engine="numpy")
+
+    pd.testing.assert_frame_equal(reduced_df, expected, check_dtype=False, check_freq=False)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_bincount_engine_matches_pandas(seed):
+    agg_trades_df = agg_trades(seed)
+    expected = expected_frame(agg_trades_df)
+
+    reduced_df = reduce_trades(agg_trades_df, "2023-09", engine="bincount")
+
+    assert_close_to(reduced_df, expected)
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("exact", [True, False])
+def test_streamed_reducer_matches_pandas(seed, exact):
+    agg_trades_df = agg_trades(seed)
+    expected = expected_frame(agg_trades_df)
+
+    reducer = TradeReducer("2023-09", exact=exact)
+    reducer.add_chunks(uneven_chunks(agg_trades_df, seed))
+    reduced_df = reducer.to_frame()
+
+    if exact:
+        pd.testing.assert_frame_equal(reduced_df, expected, check_dtype=False, check_freq=False)
+    else:
+        assert_close_to(reduced_df, expected)
+
+
+def test_streamed_datetime_chunks_match_pandas():
+    # Chunks can come with transact_time already parsed
+    agg_trades_df = agg_trades(2)
+    expected = expected_frame(agg_trades_df)
+
+    chunks = [chunk.assign(transact_time=pd.to_datetime(chunk["transact_time"], unit="ms")) for chunk in uneven_chunks(agg_trades_df, 2)]
+    reducer = TradeReducer("2023-09")
+    reducer.add_chunks(chunks)
+
+    pd.testing.assert_frame_equal(reducer.to_frame(), expected, check_dtype=False, check_freq=False)
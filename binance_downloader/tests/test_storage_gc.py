@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import retrieve_binance.feature_store as feature_store
+from retrieve_binance.feature_store import FeatureStore, FEATURE_MANIFEST
+from retrieve_binance.storage import LocalStorage
+from retrieve_binance.storage_gc import collect_garbage
+
+# Blobs collect_garbage deletes, and those it keeps
+
+REDUCED_TRADES = "reduced_trades/monthly/AAAUSDT/AAAUSDT-reduced-1S-aggTrades-{date}.parquet"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path / "storage"))
+    monkeypatch.setattr("retrieve_binance.storage._storage", storage)
+    monkeypatch.setattr(feature_store, "FEATURE_CACHE_BYTES", 0)
+    return storage
+
+
+def feature_series(value):
+    return pd.Series(np.full(10, value, dtype=np.float64), index=pd.date_range("2023-09-01", periods=10, freq="1s"))
+
+
+def save_features(storage, date, sources):
+    base_version = "+".join(storage.version(source_path) for source_path in sources)
+    features = FeatureStore("AAAUSDT", date, base_version, sources={source_path: storage.version(source_path) for source_path in sources})
+    features.save("avg_price_zscore", {"type": "zscore"}, feature_series(1.0))
+    features.save("avg_price_ema_5", {"type": "ema", "span": 5}, feature_series(2.0))
+    return features
+
+
+def stored_paths(storage):
+    return set(storage.list())
+
+
+def test_collect_garbage(storage):
+    storage.put(REDUCED_TRADES.format(date="2023-08"), b"august")
+    storage.put(REDUCED_TRADES.format(date="2023-09"), b"september")
+
+    august = save_features(storage, "2023-08", [REDUCED_TRADES.format(date="2023-08")])
+    cold = save_features(storage, "2023-09", [REDUCED_TRADES.format(date="2023-09")])
+    warmed_up = save_features(storage, "2023-09", [REDUCED_TRADES.format(date="2023-09"), REDUCED_TRADES.format(date="2023-08")])
+
+    storage.put("trading_datasets/AAAUSDT/trading_dataset_2023-09.parquet", b"dataset")
+    # A column from before feature folders had manifests
+    storage.put("features/monthly/AAAUSDT/2023-09/avg_price_zscore-0123456789abcdef.parquet", b"legacy")
+
+    kept_paths = stored_paths(storage) - {
+        "trading_datasets/AAAUSDT/trading_dataset_2023-09.parquet",
+        "features/monthly/AAAUSDT/2023-09/avg_price_zscore-0123456789abcdef.parquet",
+    }
+    assert collect_garbage(dry_run=True) != []
+    collect_garbage()
+    assert stored_paths(storage) == kept_paths
+
+    # Rebuilt August reduced trades leave August's features and the warmed up September ones stale
+    storage.put(REDUCED_TRADES.format(date="2023-08"), b"august rebuilt")
+    collect_garbage()
+
+    remaining_folders = {path.rsplit("/", 1)[0] for path in stored_paths(storage) if path.startswith("features/")}
+    assert remaining_folders == {cold.base_folder}
+    assert f"{cold.base_folder}/{FEATURE_MANIFEST}" in stored_paths(storage)
+    assert august.load("avg_price_zscore", {"type": "zscore"}) is None
+    assert warmed_up.load("avg_price_zscore", {"type": "zscore"}) is None
+    assert cold.load("avg_price_zscore", {"type": "zscore"}).equals(feature_series(1.0))
+
+    # An older FEATURE_STORE_VERSION leaves everything stale
+    storage.put(f"{cold.base_folder}/{FEATURE_MANIFEST}", b'{"feature_store_version": 0, "sources": {}}')
+    collect_garbage()
+    assert not any(path.startswith("features/") for path in stored_paths(storage))
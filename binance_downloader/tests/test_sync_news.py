@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+import retrieve_binance.retrieve_news as retrieve_news
+from retrieve_binance.news_store import NewsStore
+
+# sync_news against a local stand-in for the news API, serving /news and
+# /allNews newest first like the real one
+
+START_TIME = 1693526400000
+
+
+def news_item(number, title=None):
+    return {
+        "_id": f"news-{number}",
+        "time": START_TIME + number * 1000,
+        "title": title or f"News {number}",
+        "suggestions": [{"symbols": [{"exchange": "binance-futures", "symbol": "APTUSDT"}]}],
+    }
+
+
+class NewsAPI():
+
+    def __init__(self):
+        self.news = []
+        self.requests = []
+
+        news_api = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                news_api.requests.append(url.path)
+
+                news = sorted(news_api.news, key=lambda news_item: -news_item["time"])
+                if url.path == "/api/news":
+                    news = news[:int(parse_qs(url.query)["limit"][0])]
+                elif url.path != "/api/allNews":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                body = json.dumps(news).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_port}/api"
+
+
+@pytest.fixture
+def news_api(monkeypatch):
+    news_api = NewsAPI()
+    thread = threading.Thread(target=news_api.server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(retrieve_news, "NEWS_API_ENDPOINT", news_api.endpoint)
+    monkeypatch.setattr(retrieve_news, "NEWS_SYNC_LIMIT", 5)
+
+    yield news_api
+
+    news_api.server.shutdown()
+    news_api.server.server_close()
+
+
+@pytest.fixture
+def news_store(tmp_path):
+    news_store = NewsStore(str(tmp_path / "news.db"))
+    yield news_store
+    news_store.close()
+
+
+def stored_titles(news_store):
+    return {row[0]: json.loads(row[1])["title"] for row in news_store.connection.execute("SELECT id, item FROM news")}
+
+
+def sync(news_api, news_store):
+    # Returns how many times the sync changed the store
+    news_api.requests.clear()
+    version = news_store.version
+    synced_from = int(time.time())
+
+    retrieve_news.sync_news(news_store)
+
+    assert synced_from <= news_store.last_synced <= int(time.time())
+    return news_store.version - version
+
+
+def test_empty_store_pulls_all_news(news_api, news_store):
+    news_api.news = [news_item(number) for number in range(20)]
+
+    assert news_store.last_synced is None
+    assert sync(news_api, news_store) == 1
+
+    assert news_api.requests == ["/api/allNews"]
+    assert stored_titles(news_store) == {f"news-{number}": f"News {number}" for number in range(20)}
+    assert news_store.newest_time() == START_TIME + 19 * 1000
+
+
+def test_new_news_are_merged(news_api, news_store):
+    news_api.news = [news_item(number) for number in range(20)]
+    sync(news_api, news_store)
+
+    news_api.news += [news_item(20), news_item(21)]
+    assert sync(news_api, news_store) == 1
+
+    assert news_api.requests == ["/api/news"]
+    assert stored_titles(news_store) == {f"news-{number}": f"News {number}" for number in range(22)}
+    assert news_store.newest_time() == START_TIME + 21 * 1000
+
+
+def test_no_new_news(news_api, news_store):
+    news_api.news = [news_item(number) for number in range(20)]
+    sync(news_api, news_store)
+    news_store.set_last_synced(0)
+
+    assert sync(news_api, news_store) == 0
+
+    assert news_api.requests == ["/api/news"]
+    assert stored_titles(news_store) == {f"news-{number}": f"News {number}" for number in range(20)}
+
+
+def test_latest_news_not_reaching_the_store_pulls_all_news(news_api, news_store):
+    news_api.news = [news_item(number) for number in range(20)]
+    sync(news_api, news_store)
+
+    # More new news than the latest page holds, and an edit further back
+    news_api.news[3] = news_item(3, title="Edited")
+    news_api.news += [news_item(number) for number in range(20, 30)]
+    assert sync(news_api, news_store) == 1
+
+    assert news_api.requests == ["/api/news", "/api/allNews"]
+    titles = {f"news-{number}": f"News {number}" for number in range(30)}
+    titles["news-3"] = "Edited"
+    assert stored_titles(news_store) == titles
+    assert news_store.newest_time() == START_TIME + 29 * 1000
+
+
+def test_merge_replaces_only_changed_items(news_store, monkeypatch):
+    # Stored items are looked up a few at a time
+    monkeypatch.setattr("retrieve_binance.news_store.MERGE_BATCH_SIZE", 3)
+    news_store.merge([news_item(number) for number in range(20)])
+    version = news_store.version
+
+    assert news_store.merge([news_item(number) for number in range(20)]) == 0
+    assert news_store.version == version
+
+    news = [news_item(number) for number in range(22)]
+    news[4] = news_item(4, title="Edited")
+    news[17] = news_item(17, title="Edited")
+    assert news_store.merge(news) == 4
+    assert news_store.version == version + 1
+
+    titles = {f"news-{number}": f"News {number}" for number in range(22)}
+    titles["news-4"] = titles["news-17"] = "Edited"
+    assert stored_titles(news_store) == titles
+    assert news_store.count() == 22
@@ -0,0 +1,268 @@
+import numpy as np
+import pandas as pd
+from backtest_jit import exit_rule_arrays, find_trades
+
+# Array based version of BacktesterData.backtest_trades. Each entry signal's
+# window is handled with array searches instead of iterating rows, and gives
+# the same trade_run_data. run_thresholds evaluates many exit thresholds at
+# once, and run_exit_rules runs other exit rules through the compiled loop in
+# backtest_jit.
+
+# Signals within this long of the last trade are skipped
+TRADE_LOCKOUT = pd.Timedelta(minutes=20)
+# Window looked at around each entry signal
+WINDOW_BEFORE = pd.Timedelta(seconds=10)
+WINDOW_AFTER = pd.Timedelta(minutes=60)
+
+
+def bought_sold_ratios(num_bought_ema, num_sold_ema):
+    # Ratio used by the exit signal, 1 when either side has no trades
+    num_bought_ema = np.asarray(num_bought_ema, dtype=np.float64)
+    num_sold_ema = np.asarray(num_sold_ema, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.round(num_bought_ema / num_sold_ema, 2)
+
+    return np.where((num_sold_ema != 0) & (num_bought_ema != 0), ratios, 1.0)
+
+
+def build_entry_index(news_signal, sum_asset_sold_zscore):
+    # Rows with news and every row sorted by sum_asset_sold_zscore, built once
+    # per symbol so find_entry_positions only looks at the events
+    zscore = np.asarray(sum_asset_sold_zscore, dtype=np.float64)
+    zscore = np.where(np.isnan(zscore), -np.inf, zscore)
+    zscore_rows = np.argsort(zscore)
+
+    return {
+        "news_positions": np.flatnonzero(np.asarray(news_signal) == 1),
+        "zscore_rows": zscore_rows,
+        "zscore_sorted": zscore[zscore_rows],
+    }
+
+
+def find_entry_positions(entry_index, sum_asset_sold_zscore, time_from_news_signal, sum_asset_sold_zscore_threshold):
+    # Same rows as BacktesterData.add_entry_signal, z-score above the threshold
+    # with news in the last time_from_news_signal rows. Walks whichever is
+    # smaller, the rows after each news or the rows above the threshold.
+    news_positions = entry_index["news_positions"]
+    first_above = int(np.searchsorted(entry_index["zscore_sorted"], sum_asset_sold_zscore_threshold, side='right'))
+    num_above = len(entry_index["zscore_sorted"]) - first_above
+
+    if num_above <= len(news_positions) * time_from_news_signal:
+        rows = np.sort(entry_index["zscore_rows"][first_above:])
+
+        # Last news at or before each row
+        last_news = np.searchsorted(news_positions, rows, side='right') - 1
+        has_news = last_news >= 0
+        has_news[has_news] = news_positions[last_news[has_news]] > rows[has_news] - time_from_news_signal
+        rows = rows[has_news]
+    else:
+        rows = np.unique((news_positions[:, None] + np.arange(time_from_news_signal)).ravel())
+        rows = rows[rows < len(entry_index["zscore_sorted"])]
+        rows = rows[np.asarray(sum_asset_sold_zscore)[rows] > sum_asset_sold_zscore_threshold]
+
+    # The rolling window needs time_from_news_signal rows before it has a value
+    return rows[rows >= time_from_news_signal - 1].astype(np.int64)
+
+
+class BacktestEngine():
+
+    def __init__(self, df):
+        # df is the backtester's DataFrame, or a dict of arrays with the index
+        # as int64 nanoseconds under "timestamp", e.g. a shared dataset. The
+        # dict can give the rows of the entry signals as "entry_positions".
+        if isinstance(df, pd.DataFrame):
+            self.timestamps = pd.DatetimeIndex(df.index).asi8
+        else:
+            self.timestamps = np.asarray(df['timestamp'], dtype=np.int64)
+
+        self.index = pd.DatetimeIndex(self.timestamps)
+        self.avg_price = np.asarray(df['avg_price'], dtype=np.float64)
+        self.num_bought_ema = np.asarray(df['num_of_trades_bought_ema'], dtype=np.float64)
+        self.num_sold_ema = np.asarray(df['num_of_trades_sold_ema'], dtype=np.float64)
+        self.bought_sold_ratio = bought_sold_ratios(self.num_bought_ema, self.num_sold_ema)
+        self.news_positions = np.flatnonzero(np.asarray(df['news_signal']) == 1)
+        if 'entry_positions' in df:
+            self.entry_positions = np.asarray(df['entry_positions'], dtype=np.int64)
+        else:
+            self.entry_positions = np.flatnonzero(np.asarray(df['entry_signal']) == 1)
+
+
+    def run(self, buy_sold_ratio_threshold, trade_run_data, last_trade_index=None):
+        # Adds the trades to trade_run_data and returns the index of the last trade taken
+        entry_positions = self.trade_entries(last_trade_index)
+
+        exit_positions = []
+        for signal_position in entry_positions:
+            # First row at or after the signal past the exit threshold
+            exits = self.bought_sold_ratio[signal_position:self.window_end(signal_position)] > buy_sold_ratio_threshold
+            exit_positions.append(signal_position + int(np.argmax(exits)) if exits.any() else -1)
+
+        return self.add_trades(entry_positions, exit_positions, trade_run_data, last_trade_index)
+
+
+    def run_thresholds(self, buy_sold_ratio_thresholds, trade_run_datas, last_trade_index=None):
+        # Same as run for many exit thresholds in one pass, the entries don't
+        # depend on the threshold. Fills trade_run_datas in the same order and
+        # returns the index of the last trade taken for each.
+        entry_positions = self.trade_entries(last_trade_index)
+        thresholds = np.asarray(buy_sold_ratio_thresholds, dtype=np.float64)
+
+        # The window part of each trade is shared by every threshold
+        trade_windows = [self.trade_window(signal_position) for signal_position in entry_positions]
+
+        exit_positions = np.full((len(thresholds), len(entry_positions)), -1, dtype=np.int64)
+        for trade, signal_position in enumerate(entry_positions):
+            # The first row past a threshold is where the running max of the
+            # ratio passes it, so every threshold is one search of the max
+            ratios = self.bought_sold_ratio[signal_position:self.window_end(signal_position)]
+            ratio_max = np.maximum.accumulate(np.where(np.isnan(ratios), -np.inf, ratios))
+
+            offsets = np.searchsorted(ratio_max, thresholds, side='right')
+            exit_positions[:, trade] = np.where(offsets < len(ratio_max), signal_position + offsets, -1)
+
+        return [
+            self.add_trades(entry_positions, threshold_exit_positions, trade_run_data, last_trade_index, trade_windows)
+            for threshold_exit_positions, trade_run_data in zip(exit_positions, trade_run_datas)
+        ]
+
+
+    def run_exit_rules(self, exit_rules, trade_run_data, last_trade_index=None):
+        # Same as run but exits on the first of exit_rules to fire, see backtest_jit.EXIT_RULES,
+        # e.g. [("bought_sold_ratio", 1.3), ("time_max", 120)]
+        rule_ids, rule_parameters = exit_rule_arrays(exit_rules)
+        window_ends = np.searchsorted(self.timestamps, self.timestamps[self.entry_positions] + WINDOW_AFTER.value, side='right')
+
+        entry_positions, exit_positions = find_trades(
+            self.timestamps,
+            self.entry_positions,
+            window_ends,
+            self.bought_sold_ratio,
+            self.num_bought_ema,
+            self.num_sold_ema,
+            rule_ids,
+            rule_parameters,
+            TRADE_LOCKOUT.value,
+            last_trade_index is not None,
+            0 if last_trade_index is None else pd.Timestamp(last_trade_index).value,
+        )
+
+        return self.add_trades(entry_positions, exit_positions, trade_run_data, last_trade_index)
+
+
+    def trade_entries(self, last_trade_index=None):
+        last_trade_time = None if last_trade_index is None else pd.Timestamp(last_trade_index).value
+        entry_positions = []
+
+        for signal_position in self.entry_positions:
+            signal_time = self.timestamps[signal_position]
+
+            # Skip if entry signal is within 20 minutes of last trade
+            if last_trade_time is not None and signal_time - last_trade_time < TRADE_LOCKOUT.value:
+                continue
+
+            last_trade_time = signal_time
+            entry_positions.append(int(signal_position))
+
+        return entry_positions
+
+
+    def window_start(self, signal_position):
+        return int(np.searchsorted(self.timestamps, self.timestamps[signal_position] - WINDOW_BEFORE.value, side='left'))
+
+
+    def window_end(self, signal_position):
+        return int(np.searchsorted(self.timestamps, self.timestamps[signal_position] + WINDOW_AFTER.value, side='right'))
+
+
+    def add_trades(self, entry_positions, exit_positions, trade_run_data, last_trade_index=None, trade_windows=None):
+        # Builds trade_data for each taken entry and its exit (-1 for none),
+        # returns the index of the last trade taken. trade_windows are the
+        # entries' trade_window, when they have already been worked out.
+        trade_run_data["total_trades"] = len(self.entry_positions)
+
+        for trade, (signal_position, exit_position) in enumerate(zip(entry_positions, exit_positions)):
+            if trade_windows is None:
+                trade_window = self.trade_window(int(signal_position))
+            else:
+                trade_window = trade_windows[trade]
+            trade_data = self.__trade(trade_window, int(exit_position))
+
+            if trade_data["exit_price"] is not None:
+                price_diff = trade_data["exit_price_diff"]
+
+                if price_diff > 0:
+                    trade_run_data["winning_trades"] += 1
+                else:
+                    trade_run_data["losing_trades"] += 1
+
+                trade_run_data["total_gain_loss_percentage"] += price_diff
+                trade_run_data["average_gain_loss_percentage"] = round(trade_run_data["total_gain_loss_percentage"] / trade_run_data["total_trades"], 4)
+
+            trade_run_data["max_potentional_gain_loss_percentage"] += trade_data["potential_max_price_diff"]
+            trade_run_data["trades"].append(trade_data)
+
+        if len(entry_positions) == 0:
+            return last_trade_index
+        return self.index[entry_positions[-1]]
+
+
+    def trade_window(self, signal_position):
+        # The parts of a trade that don't depend on where it exits
+        window_start = self.window_start(signal_position)
+        window_end = self.window_end(signal_position)
+
+        entry_price = self.avg_price[signal_position]
+
+        trade_data = {
+            "entry_price": entry_price,
+            "signal_index": str(self.index[signal_position]),
+            "exit_price": None,
+            "exit_price_diff": 0,
+            "exit_index": "",
+            "max_price_diff": 0,
+            "time_in_trade": 0,
+            "news_index": None,
+            "potential_max_price_diff": 0,
+            "potential_max_price_diff_index": ""
+        }
+
+        # Rows from the signal to the end of the window
+        price_diffs = np.round((self.avg_price[signal_position:window_end] - entry_price) / entry_price, 4)
+
+        max_price_diff = price_diffs.max()
+        if max_price_diff > 0:
+            trade_data["max_price_diff"] = max_price_diff
+
+        # Last news in the window, apart from on the signal itself
+        news = self.news_positions[:np.searchsorted(self.news_positions, window_end)]
+        if len(news) and news[-1] == signal_position:
+            news = news[:-1]
+        if len(news) and news[-1] >= window_start:
+            trade_data["news_index"] = str(self.index[news[-1]])
+
+        return signal_position, price_diffs, trade_data
+
+
+    def __trade(self, trade_window, exit_position):
+        signal_position, price_diffs, window_trade_data = trade_window
+        trade_data = dict(window_trade_data)
+
+        if exit_position < 0:
+            return trade_data
+
+        exit_offset = exit_position - signal_position
+
+        trade_data["exit_price"] = self.avg_price[exit_position]
+        trade_data["exit_price_diff"] = price_diffs[exit_offset]
+        trade_data["time_in_trade"] = exit_offset + 1
+        trade_data["exit_index"] = str(self.index[exit_position])
+
+        # Best price from the exit to the end of the window
+        potential_price_diffs = price_diffs[exit_offset:]
+        potential_offset = int(np.argmax(potential_price_diffs))
+        if potential_price_diffs[potential_offset] > 0:
+            trade_data["potential_max_price_diff"] = potential_price_diffs[potential_offset]
+            trade_data["potential_max_price_diff_index"] = str(self.index[exit_position + potential_offset])
+
+        return trade_data
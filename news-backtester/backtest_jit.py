@@ -0,0 +1,90 @@
+import numpy as np
+
+# Compiled per second backtest loop for exit rules that depend on the path of
+# the trade, like run.py's EMA delta exit or a max time in trade. Numba is
+# optional, pip install -e binance_downloader[jit], without it the same loop
+# runs as plain Python. BacktestEngine.run stays the reference for the
+# bought/sold ratio exit.
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def jit(function):
+    if njit is None:
+        return function
+    return njit(cache=True)(function)
+
+
+# Exit rules as (name, parameter), checked every second from the entry:
+#   bought_sold_ratio: bought/sold EMA ratio above the parameter, backtest_trades' exit
+#   ema_delta: sold EMA below bought EMA after more than the parameter seconds, run.py's exit
+#   time_max: more than the parameter seconds in the trade
+EXIT_RULES = {
+    "bought_sold_ratio": 0,
+    "ema_delta": 1,
+    "time_max": 2,
+}
+
+
+def exit_rule_arrays(exit_rules):
+    for name, _ in exit_rules:
+        if name not in EXIT_RULES:
+            raise Exception(f"Unknown exit rule {name}")
+
+    rule_ids = np.array([EXIT_RULES[name] for name, _ in exit_rules], dtype=np.int64)
+    rule_parameters = np.array([parameter for _, parameter in exit_rules], dtype=np.float64)
+    return rule_ids, rule_parameters
+
+
+@jit
+def should_exit(rule_id, parameter, row, time_in_trade, bought_sold_ratio, bought_ema, sold_ema):
+    # Add exit rules here, and their name to EXIT_RULES
+    if rule_id == 0:
+        return bought_sold_ratio[row] > parameter
+    if rule_id == 1:
+        return time_in_trade > parameter and sold_ema[row] - bought_ema[row] < 0
+    if rule_id == 2:
+        return time_in_trade > parameter
+    return False
+
+
+@jit
+def find_trades(timestamps, signal_positions, window_ends, bought_sold_ratio, bought_ema, sold_ema,
+                rule_ids, rule_parameters, lockout, has_last_trade, last_trade_time):
+    # Returns the entry positions taken and their exit positions, -1 when no
+    # rule fires before the end of the signal's window
+    entry_positions = np.empty(len(signal_positions), dtype=np.int64)
+    exit_positions = np.empty(len(signal_positions), dtype=np.int64)
+    num_trades = 0
+
+    for signal in range(len(signal_positions)):
+        entry_position = signal_positions[signal]
+        signal_time = timestamps[entry_position]
+
+        # Skip if entry signal is within the lockout of the last trade
+        if has_last_trade and signal_time - last_trade_time < lockout:
+            continue
+
+        has_last_trade = True
+        last_trade_time = signal_time
+
+        exit_position = -1
+        for row in range(entry_position, window_ends[signal]):
+            time_in_trade = row - entry_position
+
+            for rule in range(len(rule_ids)):
+                if should_exit(rule_ids[rule], rule_parameters[rule], row, time_in_trade, bought_sold_ratio, bought_ema, sold_ema):
+                    exit_position = row
+                    break
+
+            if exit_position >= 0:
+                break
+
+        entry_positions[num_trades] = entry_position
+        exit_positions[num_trades] = exit_position
+        num_trades += 1
+
+    return entry_positions[:num_trades], exit_positions[:num_trades]
@@ -0,0 +1,374 @@
+# Brings in data for a symbol, adds an entry and exit signal, then runs the
+# backtester and measures the results. Used by main.py and the sweep runner.
+
+# Entry signal variables:
+# time_from_news_signal: 10 
+# sum_asset_sold_zscore: 100
+
+
+from retrieve_binance.retrieve_dataset import RetriveDataset
+from retrieve_binance.plot_data import plot_data
+from backtest_engine import BacktestEngine
+from results_store import ResultsStore, hash_dict_to_string
+import pandas as pd
+import copy
+import os
+import time
+from dotenv import load_dotenv
+import numpy as np
+import matplotlib.pyplot as plt
+
+load_dotenv()
+
+LOCAL_LOCATION = os.getenv("LOCAL_LOCATION")
+
+CONFIG = {
+    "columns": [
+        "avg_price",
+        "sum_asset_bought",
+        "num_of_trades_bought",
+        "sum_asset_sold",
+        "num_of_trades_sold",
+    ], 
+    "features": [
+        {
+            "type": "news_signal"
+        }, 
+        {
+            "type": "future_diff",
+            "columns": [
+                "avg_price"
+            ],
+            "periods": [
+              60,
+            ]
+        }, 
+        {
+            "type": "zscore",
+            "columns": [
+                "sum_asset_bought",
+                "num_of_trades_bought",
+                "sum_asset_sold",
+                "num_of_trades_sold",
+            ]
+        },
+        {
+            "type": "moving_average",
+            "periods": [
+              5,
+            ],
+            "columns": [
+                "sum_asset_bought_zscore",
+                "num_of_trades_bought_zscore",
+                "sum_asset_sold_zscore",
+                "num_of_trades_sold_zscore",
+            ]
+        }, 
+        {
+            "type": "ratio",
+            "columns": [
+                "sum_asset_bought_zscore_moving_average_MA_5",
+                "sum_asset_sold_zscore_moving_average_MA_5",
+            ],
+            "column_name": "sum_asset_bought_to_sold_ratio"
+        }, 
+        {
+            "type": "ratio",
+            "columns": [
+                "num_of_trades_bought_zscore_moving_average_MA_5",
+                "num_of_trades_sold_zscore_moving_average_MA_5",
+            ],
+            "column_name": "num_of_trades_bought_to_sold_ratio"
+        }
+    ]
+}
+
+SIGNAL_VARIABLES = {
+    "entry" :{
+        "time_from_news_signal": 10,
+        "sum_asset_sold_zscore": 110, 
+    }, 
+    "exit": {
+        "buy_sold_ratio": 1.3,
+    }, 
+    "features": {
+        "num_trade_ema_span": 5,
+    }
+}
+
+def new_trade_run_data(symbol, date, signal_variables):
+    return {
+        "symbol": symbol,
+        "date": date,
+        "signal_variables": signal_variables,
+        "total_trades": 0,
+        "winning_trades": 0,
+        "losing_trades": 0,
+        "total_gain_loss_percentage": 0,
+        "average_gain_loss_percentage": 0,
+        "max_potentional_gain_loss_percentage": 0,
+        "trades": []
+    }
+
+
+def backtester_config(num_trade_ema_span):
+    # EMAs used by the exit signal are built as features alongside the rest of the dataset
+    config = copy.deepcopy(CONFIG)
+    config["features"] += [
+        {
+            "type": "ema",
+            "span": num_trade_ema_span,
+            "columns": ["num_of_trades_sold", "num_of_trades_bought", "sum_asset_sold", "sum_asset_bought"],
+            "column_names": ["num_of_trades_sold_ema", "num_of_trades_bought_ema", "sum_of_trades_sold_ema", "sum_of_trades_bought_ema"]
+        },
+        {
+            "type": "ema",
+            "span": 7,
+            "columns": ["num_of_trades_sold_zscore", "num_of_trades_bought_zscore", "sum_asset_sold_zscore", "sum_asset_bought_zscore"],
+            "column_names": ["num_of_trades_sold_zscore_ema", "num_of_trades_bought_zscore_ema", "sum_of_trades_sold_zscore_ema", "sum_of_trades_bought_zscore_ema"]
+        }
+    ]
+    return config
+
+
+def sweep_config(num_trade_ema_spans):
+    # The exit EMAs of every span in one dataset, named e.g. num_of_trades_bought_ema_5
+    config = copy.deepcopy(CONFIG)
+    config["features"].append({
+        "type": "ema",
+        "spans": list(num_trade_ema_spans),
+        "columns": ["num_of_trades_sold", "num_of_trades_bought"],
+        "column_names": ["num_of_trades_sold_ema", "num_of_trades_bought_ema"]
+    })
+    return config
+
+
+def retrieve_symbol_dataset(symbol, date, num_trade_ema_span):
+    # Repeated runs read the dataset from the local blob cache
+    symbol_retriever = RetriveDataset(symbol, date, backtester_config(num_trade_ema_span))
+    return symbol_retriever.retrieve_trading_dataset()
+
+
+def retrieve_sweep_dataset(symbol, date, num_trade_ema_spans, warm_up=None):
+    # EMAs are stored by column and span, so a span already run is loaded instead of computed
+    symbol_retriever = RetriveDataset(symbol, date, sweep_config(num_trade_ema_spans), warm_up=warm_up)
+    return symbol_retriever.retrieve_trading_dataset()
+
+
+def sweep_results_store(warm_up=None):
+    # Results of runs on CONFIG's features. The sweep, walk forward and results
+    # scripts all open it here so a parameter set has the same key in each.
+    # Warmed up features give different results to single months, so they're kept apart.
+    feature_config = CONFIG["features"] if warm_up is None else {"features": CONFIG["features"], "warm_up": warm_up}
+    return ResultsStore(feature_config=feature_config)
+
+
+class BacktesterData():
+
+    def __init__(self, symbol, date, signal_variables=SIGNAL_VARIABLES, should_plot=False, verbose=False, symbol_dataset=None):
+
+        self.trade_run_data = new_trade_run_data(symbol, date, signal_variables)
+        self.symbol = symbol
+        self.date = date
+        self.signal_variables = signal_variables
+        self.verbose = verbose
+        self.last_trade_index = None
+
+        # A dataset already retrieved for this span can be passed in, e.g. by the sweep runner
+        if symbol_dataset is None:
+            symbol_dataset = retrieve_symbol_dataset(symbol, date, signal_variables["features"]["num_trade_ema_span"])
+        self.symbol_dataset = symbol_dataset
+
+        if self.symbol_dataset is None:
+            print(f"> No data for {symbol} on {date}")
+            return
+
+        self.symbol_dataset = self.add_entry_signal(self.symbol_dataset)
+        
+
+        if should_plot:
+            signals_to_plot = ['news_signal', 'entry_signal']
+            plot_data(self.symbol_dataset, symbol, signals_to_plot=signals_to_plot, title="APT_2023_09")
+
+
+    def add_entry_signal(self, df):
+        news_seconds_variable = self.signal_variables["entry"]["time_from_news_signal"]
+        sum_asset_sold_zscore_variable = self.signal_variables["entry"]["sum_asset_sold_zscore"]
+
+        print("> Adding entry signal")
+        print(f"> Seconds from news: {news_seconds_variable} seconds", )
+        print(f"> Sum asset sold zscore threshold: {sum_asset_sold_zscore_variable}")
+
+        df["entry_signal"] = 0
+        df['news_signal_past'] = df['news_signal'].rolling(window=news_seconds_variable).max()
+
+        mask = (
+            (df['sum_asset_sold_zscore'] > sum_asset_sold_zscore_variable) & 
+            (df['news_signal_past'] == 1)
+        )
+
+        df.loc[mask, 'entry_signal'] = 1
+
+        print("> Entry signal added")
+        amount_of_signals = len(df[df['entry_signal'] == 1])
+        print(f"> Amount of entry signals: {amount_of_signals}")
+        return df
+    
+
+    def backtest_trades(self, exit_rules=None):
+
+        bought_sold_ratio_threshold = self.signal_variables["exit"]["buy_sold_ratio"]
+
+        # The row by row version prints each row, otherwise the array engine gives the same results
+        if self.verbose and exit_rules is None:
+            return self.backtest_trades_rows()
+
+        print("> Adding exit signal")
+        engine = BacktestEngine(self.symbol_dataset)
+
+        # Other exit rules, e.g. [("bought_sold_ratio", 1.3), ("ema_delta", 5), ("time_max", 120)]
+        if exit_rules is not None:
+            print(f"> Exit rules: {exit_rules}")
+            self.last_trade_index = engine.run_exit_rules(exit_rules, self.trade_run_data, self.last_trade_index)
+            return
+
+        print(f"> Buy sold ratio threshold: {bought_sold_ratio_threshold}")
+        self.last_trade_index = engine.run(bought_sold_ratio_threshold, self.trade_run_data, self.last_trade_index)
+
+
+    def backtest_trades_rows(self):
+
+        df = self.symbol_dataset.copy()
+
+        bought_sold_ratio_threshold = self.signal_variables["exit"]["buy_sold_ratio"]
+
+        print("> Adding exit signal")
+        print(f"> Buy sold ratio threshold: {bought_sold_ratio_threshold}")
+
+        entry_signals = df[df['entry_signal'] == 1]
+
+        # Adds total trades
+        self.trade_run_data["total_trades"] = len(entry_signals)
+
+        # Iterate through entry signals
+        for signal_index, signal_row in entry_signals.iterrows():
+
+            # Skip if entry signal is within 20 minutes of last trade
+            if self.last_trade_index is not None:
+                if signal_index - self.last_trade_index < pd.Timedelta(minutes=20):
+                    continue
+            
+            self.last_trade_index = signal_index
+
+            entry_price = signal_row['avg_price']
+
+            if self.verbose:
+                print("-----")
+                print(f"Entry signal at {signal_index}")
+                print(f"Entry price: {entry_price}")
+
+            signal_df = df.loc[signal_index-pd.Timedelta(seconds=10):signal_index+pd.Timedelta(minutes=60)]
+            past_signal, trade_finished = False, False
+            time_in_trade = 0
+
+            trade_data = {
+                "entry_price": entry_price,
+                "signal_index": str(signal_index),
+                "exit_price": None,
+                "exit_price_diff": 0,
+                "exit_index": "",
+                "max_price_diff": 0,
+                "time_in_trade": 0,
+                "news_index": None,
+                "potential_max_price_diff": 0, 
+                "potential_max_price_diff_index": ""
+            }
+
+            for index, row in signal_df.iterrows():
+                num_bought_ema = row['num_of_trades_bought_ema']
+                num_sold_ema = row['num_of_trades_sold_ema']
+
+                sum_bought_ema = row['sum_of_trades_bought_ema']
+                sum_sold_ema = row['sum_of_trades_sold_ema']
+
+                if num_sold_ema != 0 and num_bought_ema != 0:
+                    bought_sold_ratio = round(num_bought_ema / num_sold_ema, 2)
+                else:
+                    bought_sold_ratio = 1
+
+                if sum_sold_ema != 0 and sum_bought_ema != 0:
+                    sum_bought_sold_ratio = round(sum_bought_ema / sum_sold_ema, 2)
+                else:
+                    sum_bought_sold_ratio = 1
+                
+
+                price_diff = round((row['avg_price'] - entry_price) / entry_price, 4)
+
+                if signal_index == index:
+                    past_signal = True
+                    # print(f"{index}: {row['avg_price']} <--- SIGNAL Entry price")
+                else:
+                    if row["news_signal"] == 1:
+                        trade_data["news_index"] = str(index)
+
+                if past_signal:
+                    time_in_trade += 1
+                    trade_data["max_price_diff"] = max(trade_data["max_price_diff"], price_diff)
+                
+                if self.verbose:
+                    message = f"sum_asset_bought_zscore: {row['sum_asset_bought_zscore']}, num_of_trades_bought_zscore: {row['num_of_trades_bought_zscore']}, sum_asset_sold_zscore: {row['sum_asset_sold_zscore']}, num_of_trades_sold_zscore: {row['num_of_trades_sold_zscore']}"
+                    # message = f"num_bought_ema: {num_bought_ema}, num_sold_ema: {num_sold_ema}, sum_bought_ema: {sum_bought_ema}, sum_sold_ema: {sum_sold_ema}, "
+
+                    if past_signal:
+                        message += f", bought_sold_ratio: {bought_sold_ratio}, sum_bought_sold_ratio: {sum_bought_sold_ratio}, price_diff: {price_diff}"
+
+                    if signal_index == index:
+                        message += " <--- SIGNAL Entry price"
+
+                    if (past_signal and not trade_finished) and bought_sold_ratio > bought_sold_ratio_threshold:
+                        message += " <--- SIGNAL Exit price"
+
+                    print(f"> {index}: {message}")      
+
+                # Eligible and passes threshold
+                if (past_signal and not trade_finished) and bought_sold_ratio > bought_sold_ratio_threshold:
+                    exit_price = row['avg_price']
+
+                    trade_data["exit_price"] = exit_price
+                    trade_data["exit_price_diff"] = price_diff
+                    trade_data["time_in_trade"] = time_in_trade
+                    trade_data["exit_index"] = str(index)
+
+                    if price_diff > 0:
+                        self.trade_run_data["winning_trades"] += 1
+                    else:
+                        self.trade_run_data["losing_trades"] += 1
+
+                    self.trade_run_data["total_gain_loss_percentage"] += price_diff
+                    self.trade_run_data["average_gain_loss_percentage"] = round(self.trade_run_data["total_gain_loss_percentage"] / self.trade_run_data["total_trades"], 4)
+                    
+                    trade_finished = True
+
+                if trade_finished:
+                    last_potential = trade_data["potential_max_price_diff"]
+                    trade_data["potential_max_price_diff"] = max(last_potential, price_diff)
+
+                    if trade_data["potential_max_price_diff"] != last_potential:
+                        trade_data["potential_max_price_diff_index"] = str(index)
+
+                if self.verbose:
+                    time.sleep(1)
+
+            self.trade_run_data["max_potentional_gain_loss_percentage"] += trade_data["potential_max_price_diff"]
+            
+            self.trade_run_data["trades"].append(trade_data)
+
+
+    def save_trade_run_data(self, results_store=None):
+        # Runs go to the results store, the sweep's by default
+        print("> Saving trade run data")
+        if results_store is None:
+            results_store = sweep_results_store()
+
+        results_store.add_runs([self.trade_run_data])
+        print(f"> Saved to {results_store.db_path}")
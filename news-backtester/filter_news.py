@@ -2,29 +2,32 @@ from dotenv import load_dotenv
 import os
 import pandas as pd
 import json
+from retrieve_binance.multi_month import month_range
 
 
 load_dotenv()
 
 LOCAL_LOCATION = "/home/ben/dev/news-trading/binance_downloader/local"
 notable_news = []
+dates = month_range("2023-09", "2023-09")
 
 for symbol in os.listdir(f"{LOCAL_LOCATION}/top_movements"):
-    try:
-        filepath = f"{LOCAL_LOCATION}/top_movements/{symbol}/2023-09/2023-09_news_signal.csv"
-        df = pd.read_csv(filepath)
-    except:
-        continue
+    for date in dates:
+        try:
+            filepath = f"{LOCAL_LOCATION}/top_movements/{symbol}/{date}/{date}_news_signal.csv"
+            df = pd.read_csv(filepath)
+        except:
+            continue
 
-    df = df[(df["signal"] > 0.05) & (abs(df["avg_price_future_diff_60"]) > 0.01)]
+        df = df[(df["signal"] > 0.05) & (abs(df["avg_price_future_diff_60"]) > 0.01)]
 
-    for index, row in df.iterrows():
-        news_item = {}
-        news_item["symbol"] = symbol
-        news_item["date"] = row["floored_time"]
-        news_item["movement_amount"] = row["signal"]
-        news_item["timestamp"] = int(pd.to_datetime(row["floored_time"]).value / 1e9)
-        notable_news.append(news_item)
+        for index, row in df.iterrows():
+            news_item = {}
+            news_item["symbol"] = symbol
+            news_item["date"] = row["floored_time"]
+            news_item["movement_amount"] = row["signal"]
+            news_item["timestamp"] = int(pd.to_datetime(row["floored_time"]).value / 1e9)
+            notable_news.append(news_item)
         
 notable_news_sorted = sorted(notable_news, key=lambda x: x['movement_amount'], reverse=True)
 
@@ -1,36 +1,14 @@
-import os 
-import json
+from backtester_data import sweep_results_store
 
+# Ranks the parameter sets in the results store by total gain/loss.
+# Older JSON results can be imported first with python results_store.py
 
-results_dict = {}
-
-for folder in os.listdir('results/'):
-    
-    if 'overall_results.json' in os.listdir(f'results/{folder}'):
-        with open(f'results/{folder}/overall_results.json', 'r') as f:
-            results = json.load(f)
-
-#         # if results["SIGNAL_VARIABLES"]["exit"]["buy_sold_ratio"] == 0.3:
-#         results_dict[folder] = results['total_gain_loss_percentage']
-        print(folder, results['total_gain_loss_percentage'])    
-
-
-# results_dict = {k: v for k, v in sorted(results_dict.items(), key=lambda item: item[1], reverse=True)}
-# i, show_top = 0, 10
-
-# for k, v in results_dict.items():
-#     if i < show_top:
-#         i += 1
-#     else:
-#         break
-
-#     with open(f'results/{k}/overall_results.json', 'r') as f:
-#         results = json.load(f)
-
-    # print(f"Variable hash: {k}")
-
-    # print(results['total_gain_loss_percentage'])
-    # print(results['SIGNAL_VARIABLES'])
-
+show_top = 10
+date = None
 
+results_store = sweep_results_store()
 
+for parameter_set in results_store.top_parameter_sets(date=date, n=show_top):
+    print(f"Variable hash: {parameter_set['hash']} ({parameter_set['date']}, {parameter_set['num_symbols']} symbols)")
+    print(round(parameter_set['total_gain_loss_percentage'], 4))
+    print(parameter_set['signal_variables'])
@@ -0,0 +1,367 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+from dotenv import load_dotenv
+from retrieve_binance.feature_store import FEATURE_STORE_VERSION
+from retrieve_binance.news_store import NEWS_RESOLVER_VERSION
+
+load_dotenv()
+
+# Backtest results in one SQLite database instead of results/{date}/{hash}/
+# JSON files. Each run is one symbol and month under a parameter set, with
+# its trades. Parameter sets are keyed by a full hash of the signal
+# variables, the dataset's feature config and the code versions, see
+# parameter_key. Runs are written in transactions, and the overall results of
+# a parameter set are added up by query.
+#
+#   python results_store.py [results folder]    imports existing JSON results
+
+RESULTS_DB = os.getenv("RESULTS_DB", "results/results.db")
+RESULTS_SCHEMA_VERSION = 3
+
+# Bump when a change to the backtester changes its results, so resumed sweeps run everything again
+BACKTEST_VERSION = 1
+
+RUN_COLUMNS = [
+    "total_trades",
+    "winning_trades",
+    "losing_trades",
+    "total_gain_loss_percentage",
+    "average_gain_loss_percentage",
+    "max_potentional_gain_loss_percentage",
+]
+# Stored as INTEGER, the rest of RUN_COLUMNS as REAL
+RUN_COUNT_COLUMNS = ["total_trades", "winning_trades", "losing_trades"]
+
+TRADE_COLUMNS = [
+    "entry_price",
+    "signal_index",
+    "exit_price",
+    "exit_price_diff",
+    "exit_index",
+    "max_price_diff",
+    "time_in_trade",
+    "news_index",
+    "potential_max_price_diff",
+    "potential_max_price_diff_index",
+]
+
+def runs_table(table_name):
+    return f"""
+CREATE TABLE IF NOT EXISTS {table_name} (
+    id INTEGER PRIMARY KEY,
+    parameter_key TEXT NOT NULL REFERENCES parameter_sets(key),
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    {", ".join(f"{column} {'INTEGER' if column in RUN_COUNT_COLUMNS else 'REAL'} NOT NULL DEFAULT 0" for column in RUN_COLUMNS)},
+    UNIQUE (parameter_key, date, symbol)
+);
+"""
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS parameter_sets (
+    key TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    signal_variables TEXT NOT NULL,
+    feature_config TEXT
+);
+{runs_table("runs")}
+
+CREATE INDEX IF NOT EXISTS runs_by_date ON runs (date, parameter_key, total_gain_loss_percentage);
+
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    {", ".join(TRADE_COLUMNS)}
+);
+
+CREATE INDEX IF NOT EXISTS trades_by_run ON trades (run_id);
+"""
+
+
+def hash_dict_to_string(d):
+    # Short hash for results folders and printing, use parameter_key to tell runs apart
+    serialized_dict = json.dumps(d, sort_keys=True).encode('utf-8')
+    
+    hash_object = hashlib.sha256(serialized_dict)
+    hash_hex = hash_object.hexdigest()
+    
+    return str(hash_hex)[-5:]
+
+
+def parameter_key(signal_variables, feature_config=None):
+    serialized_key = json.dumps({
+        "signal_variables": signal_variables,
+        "feature_config": feature_config,
+        "backtest_version": BACKTEST_VERSION,
+        "feature_store_version": FEATURE_STORE_VERSION,
+        "news_resolver_version": NEWS_RESOLVER_VERSION,
+    }, sort_keys=True).encode('utf-8')
+
+    return hashlib.sha256(serialized_key).hexdigest()
+
+
+def run_aggregate(column):
+    # SQL adding up a run column over runs. The average is taken over all of
+    # their trades, a sum of averages means nothing.
+    if column == "average_gain_loss_percentage":
+        return "COALESCE(SUM(total_gain_loss_percentage) / NULLIF(SUM(total_trades), 0), 0)"
+    return f"COALESCE(SUM({column}), 0)"
+
+
+def to_sql_value(value):
+    # Trade data holds numpy scalars, which sqlite3 can't always bind
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class RunRegistry():
+    # Every stored (parameter key, date, symbol), loaded once so checking
+    # whether a run is done doesn't go to the database
+
+    def __init__(self, connection):
+        rows = connection.execute("SELECT parameter_key, date, symbol FROM runs")
+        self.runs = {tuple(row) for row in rows}
+
+
+    def __contains__(self, run):
+        return run in self.runs
+
+
+    def add(self, run):
+        self.runs.add(run)
+
+
+class ResultsStore():
+
+    def __init__(self, db_path=RESULTS_DB, feature_config=None):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        self.db_path = db_path
+        # Part of every parameter key, e.g. backtester_data.CONFIG["features"]
+        self.feature_config = feature_config
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        # Lets results be queried while a sweep is writing
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+
+        schema_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        has_tables = self.connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'runs'").fetchone()[0] > 0
+        if has_tables and schema_version == 2:
+            self.__migrate_run_counts()
+        elif has_tables and schema_version != RESULTS_SCHEMA_VERSION:
+            raise Exception(f"{db_path} is from an older version of the results store, import the JSON results into a new one")
+
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {RESULTS_SCHEMA_VERSION}")
+        self.registry = RunRegistry(self.connection)
+
+
+    def close(self):
+        self.connection.close()
+
+
+    def __migrate_run_counts(self):
+        # Version 2 stored the trade counts as REAL. SQLite can't change a
+        # column's type, so runs is copied into a new table. Foreign keys are
+        # off meanwhile, or dropping runs would delete the trades with it.
+        print(f"> Migrating {self.db_path} to store trade counts as integers")
+        self.connection.execute("PRAGMA foreign_keys=OFF")
+        try:
+            with self.connection:
+                self.connection.execute(runs_table("runs_v3"))
+                self.connection.execute("INSERT INTO runs_v3 SELECT * FROM runs")
+                self.connection.execute("DROP TABLE runs")
+                self.connection.execute("ALTER TABLE runs_v3 RENAME TO runs")
+                self.connection.execute(f"PRAGMA user_version = {RESULTS_SCHEMA_VERSION}")
+        finally:
+            self.connection.execute("PRAGMA foreign_keys=ON")
+
+
+    def add_runs(self, trade_run_datas):
+        # Writes the runs and their trades in one transaction, replacing any
+        # earlier run of the same parameter set, symbol and month
+        runs = []
+        with self.connection:
+            for trade_run_data in trade_run_datas:
+                runs.append(self.__add_run(trade_run_data))
+
+        # Only once the transaction is in
+        for run in runs:
+            self.registry.add(run)
+
+
+    def parameter_key(self, signal_variables):
+        return parameter_key(signal_variables, self.feature_config)
+
+
+    def has_run(self, date, signal_variables, symbol):
+        return (self.parameter_key(signal_variables), date, symbol) in self.registry
+
+
+    def symbols_contributing(self, date, signal_variables):
+        rows = self.connection.execute(
+            "SELECT symbol FROM runs WHERE date = ? AND parameter_key = ?",
+            (date, self.parameter_key(signal_variables))
+        )
+        return {row["symbol"] for row in rows}
+
+
+    def overall_results(self, date, signal_variables):
+        # Same fields as the old overall_results.json
+        row = self.connection.execute(
+            f"""
+            SELECT {", ".join(f"{run_aggregate(column)} AS {column}" for column in RUN_COLUMNS)}
+            FROM runs WHERE date = ? AND parameter_key = ?
+            """,
+            (date, self.parameter_key(signal_variables))
+        ).fetchone()
+
+        overall_results = {
+            "total_trades": int(row["total_trades"]),
+            "winning_trades": int(row["winning_trades"]),
+            "losing_trades": int(row["losing_trades"]),
+            "total_gain_loss_percentage": round(row["total_gain_loss_percentage"], 4),
+            "average_gain_loss_percentage": round(row["average_gain_loss_percentage"], 4),
+            "max_potentional_gain_loss_percentage": round(row["max_potentional_gain_loss_percentage"], 4),
+            "symbols_contributing": sorted(self.symbols_contributing(date, signal_variables)),
+            "SIGNAL_VARIABLES": signal_variables
+        }
+        return overall_results
+
+
+    def top_parameter_sets(self, date=None, n=10, order_by="total_gain_loss_percentage", dates=None):
+        # Parameter sets with the highest sum of order_by over their runs, see
+        # run_aggregate. With dates, summed over those months, for parameter
+        # sets run in all of them.
+        if order_by not in RUN_COLUMNS:
+            raise Exception(f"Can't order parameter sets by {order_by}")
+
+        group_by, having = "runs.date, runs.parameter_key", ""
+        where, parameters = ("WHERE date = ?", [date]) if date is not None else ("", [])
+        if dates is not None:
+            dates = list(dates)
+            group_by = "runs.parameter_key"
+            where, parameters = f"WHERE date IN ({', '.join('?' * len(dates))})", dates
+            having, parameters = "HAVING COUNT(DISTINCT runs.date) = ?", parameters + [len(dates)]
+
+        rows = self.connection.execute(
+            f"""
+            SELECT runs.parameter_key, parameter_sets.hash, MAX(runs.date) AS date, parameter_sets.signal_variables,
+                COUNT(DISTINCT runs.symbol) AS num_symbols, COUNT(DISTINCT runs.date) AS num_months,
+                {", ".join(f"{run_aggregate(column)} AS {column}" for column in RUN_COLUMNS)}
+            FROM runs JOIN parameter_sets ON parameter_sets.key = runs.parameter_key
+            {where}
+            GROUP BY {group_by}
+            {having}
+            ORDER BY {order_by} DESC
+            LIMIT ?
+            """,
+            parameters + [n]
+        )
+
+        top_parameter_sets = []
+        for row in rows:
+            parameter_set = dict(row)
+            parameter_set["signal_variables"] = json.loads(parameter_set["signal_variables"])
+            top_parameter_sets.append(parameter_set)
+
+        return top_parameter_sets
+
+
+    def trades(self, date, signal_variables, symbol=None):
+        where, parameters = "runs.date = ? AND runs.parameter_key = ?", [date, self.parameter_key(signal_variables)]
+        if symbol is not None:
+            where, parameters = f"{where} AND runs.symbol = ?", parameters + [symbol]
+
+        rows = self.connection.execute(
+            f"SELECT runs.symbol, trades.* FROM trades JOIN runs ON runs.id = trades.run_id WHERE {where} ORDER BY runs.symbol, trades.rowid",
+            parameters
+        )
+        return [dict(row) for row in rows]
+
+
+    def import_json_results(self, results_folder="results"):
+        # Imports every overall_results.json under results_folder with its
+        # trade_run files. Symbols that contributed without trades have no
+        # trade_run file and are added as empty runs.
+        num_runs = 0
+
+        for folder, _, file_names in os.walk(results_folder):
+            if "overall_results.json" not in file_names:
+                continue
+
+            with open(f"{folder}/overall_results.json", "r") as f:
+                overall_results = json.load(f)
+            signal_variables = overall_results["SIGNAL_VARIABLES"]
+
+            trade_run_datas = {}
+            for file_name in file_names:
+                match = re.match(r"trade_run_(.+)_(\d{4}-\d{2}(?:-\d{2})?)\.json$", file_name)
+                if match is None:
+                    continue
+
+                with open(f"{folder}/{file_name}", "r") as f:
+                    trade_run_data = json.load(f)
+                trade_run_data.setdefault("symbol", match.group(1))
+                trade_run_data.setdefault("date", match.group(2))
+                trade_run_data.setdefault("signal_variables", signal_variables)
+                trade_run_datas[trade_run_data["symbol"]] = trade_run_data
+
+            # results/{date}/{hash}, or the date of the trade runs for the older results/{hash}
+            date = os.path.basename(os.path.dirname(os.path.normpath(folder)))
+            if not re.match(r"\d{4}-\d{2}", date):
+                dates = {trade_run_data["date"] for trade_run_data in trade_run_datas.values()}
+                date = dates.pop() if len(dates) == 1 else None
+
+            for symbol in overall_results.get("symbols_contributing", []):
+                if symbol not in trade_run_datas and date is not None:
+                    trade_run_datas[symbol] = {"symbol": symbol, "date": date, "signal_variables": signal_variables, "trades": []}
+
+            print(f"> Importing {len(trade_run_datas)} runs from {folder}")
+            self.add_runs(trade_run_datas.values())
+            num_runs += len(trade_run_datas)
+
+        return num_runs
+
+
+    def __add_run(self, trade_run_data):
+        signal_variables = trade_run_data["signal_variables"]
+        key = self.parameter_key(signal_variables)
+
+        self.connection.execute(
+            "INSERT OR IGNORE INTO parameter_sets (key, hash, signal_variables, feature_config) VALUES (?, ?, ?, ?)",
+            (key, hash_dict_to_string(signal_variables), json.dumps(signal_variables, sort_keys=True), json.dumps(self.feature_config, sort_keys=True))
+        )
+        # Trades of a replaced run go with it
+        self.connection.execute(
+            "DELETE FROM runs WHERE parameter_key = ? AND date = ? AND symbol = ?",
+            (key, trade_run_data["date"], trade_run_data["symbol"])
+        )
+
+        run_id = self.connection.execute(
+            f"INSERT INTO runs (parameter_key, symbol, date, {', '.join(RUN_COLUMNS)}) VALUES (?, ?, ?{', ?' * len(RUN_COLUMNS)})",
+            [key, trade_run_data["symbol"], trade_run_data["date"]] + [to_sql_value(trade_run_data.get(column, 0)) for column in RUN_COLUMNS]
+        ).lastrowid
+
+        self.connection.executemany(
+            f"INSERT INTO trades (run_id, {', '.join(TRADE_COLUMNS)}) VALUES (?{', ?' * len(TRADE_COLUMNS)})",
+            [[run_id] + [to_sql_value(trade_data.get(column)) for column in TRADE_COLUMNS] for trade_data in trade_run_data["trades"]]
+        )
+
+        return key, trade_run_data["date"], trade_run_data["symbol"]
+
+
+if __name__ == "__main__":
+    import sys
+    from backtester_data import sweep_results_store
+
+    # The JSON results are of sweeps, keyed like the sweep keys them
+    results_store = sweep_results_store()
+    num_runs = results_store.import_json_results(sys.argv[1] if len(sys.argv) > 1 else "results")
+    print(f"> Imported {num_runs} runs into {results_store.db_path}")
@@ -1,4 +1,5 @@
 from retrieve_binance.retrieve_dataset import RetriveDataset
+from retrieve_binance.multi_month import month_range
 from retrieve_binance.plot_data import plot_data
 import pandas as pd
 import copy
@@ -294,7 +295,7 @@ def backtest(df):
 
 
 
-date = "2023-09"
+dates = month_range("2023-09", "2023-09")
 
 def plot_decay(index, buy_trades, sell_trades, symbol):
     
@@ -344,26 +345,27 @@ def find_signals():
 
     signal_key = 'sum_asset_sold_zscore > 120 OR num_of_trades_sold_zscore > 120'
 
-    for symbol in symbols:
-        try:
-            df = RetriveDataset(symbol=symbol, date=date, config=copy.deepcopy(feature_config)).retrieve_trading_dataset()
-            symbol_df = df[df['signal'] == 1]
+    for date in dates:
+        for symbol in symbols:
+            try:
+                df = RetriveDataset(symbol=symbol, date=date, config=copy.deepcopy(feature_config)).retrieve_trading_dataset()
+                symbol_df = df[df['signal'] == 1]
 
-            for index, row in symbol_df.iterrows():
-                backtest(df, index, symbol, date, should_save_csv=True)
+                for index, row in symbol_df.iterrows():
+                    backtest(df, index, symbol, date, should_save_csv=True)
 
-            
-            if len(symbol_df) == 0:
-                continue
 
-            if not os.path.exists(f'{LOCAL_LOCATION}/signals/{symbol}'):
-                os.makedirs(f'{LOCAL_LOCATION}/signals/{symbol}')
+                if len(symbol_df) == 0:
+                    continue
+
+                if not os.path.exists(f'{LOCAL_LOCATION}/signals/{symbol}'):
+                    os.makedirs(f'{LOCAL_LOCATION}/signals/{symbol}')
 
-            print("Saving signal df")
-            print(f"Saving to {LOCAL_LOCATION}/signals/{symbol}/symbol_df.csv")
-            symbol_df.to_csv(f'{LOCAL_LOCATION}/signals/{symbol}/symbol_df.csv')
-        except:
-            pass
+                print("Saving signal df")
+                print(f"Saving to {LOCAL_LOCATION}/signals/{symbol}/{date}_symbol_df.csv")
+                symbol_df.to_csv(f'{LOCAL_LOCATION}/signals/{symbol}/{date}_symbol_df.csv')
+            except:
+                pass
 
 
 # find_signals()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Hands a symbol's numeric columns to sweep workers without pickling them.
+# The parent writes each column once as a .npy file, in /dev/shm when it has
+# room so it stays in memory, and workers map them read only as zero copy
+# NumPy views by the dataset's path. The folder is removed when the sweep
+# is done with the symbol.
+
+# Where the datasets are written, by default /dev/shm or the temp folder when
+# it's too small, e.g. Docker's 64MB default
+SHARED_DATASET_LOCATION = os.getenv("SHARED_DATASET_LOCATION")
+SHARED_MEMORY_LOCATION = "/dev/shm"
+
+# Datasets attached in this process, by path
+ATTACHED_DATASETS = {}
+
+
+class SharedDataset():
+
+    def __init__(self, name, columns):
+        num_bytes = sum(np.asarray(values).nbytes for values in columns.values())
+        self.path = tempfile.mkdtemp(prefix=f"sweep-{name}-", dir=shared_location(num_bytes))
+        self.columns = list(columns)
+
+        for column, values in columns.items():
+            np.save(f"{self.path}/{column}.npy", np.ascontiguousarray(values))
+
+
+    def unlink(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def shared_location(num_bytes):
+    if SHARED_DATASET_LOCATION is not None:
+        return SHARED_DATASET_LOCATION
+
+    # Room is left for other sweeps' datasets, and the .npy headers
+    if os.path.isdir(SHARED_MEMORY_LOCATION) and shutil.disk_usage(SHARED_MEMORY_LOCATION).free > 2 * num_bytes + 1024 ** 2:
+        return SHARED_MEMORY_LOCATION
+
+    print(f"> {SHARED_MEMORY_LOCATION} is missing or too small for {num_bytes} bytes, sharing the dataset from {tempfile.gettempdir()}")
+    return tempfile.gettempdir()
+
+
+def attach_dataset(path):
+    # Column name to read only view, mapped once per process
+    if path not in ATTACHED_DATASETS:
+        # Only the latest dataset is kept, the sweep moves through symbols in order
+        ATTACHED_DATASETS.clear()
+        ATTACHED_DATASETS[path] = {
+            file_name[:-len(".npy")]: np.load(f"{path}/{file_name}", mmap_mode="r")
+            for file_name in os.listdir(path)
+            if file_name.endswith(".npy")
+        }
+
+    return ATTACHED_DATASETS[path]
@@ -0,0 +1,206 @@
+import os
+import multiprocessing
+from collections import deque
+from backtester_data import retrieve_sweep_dataset, sweep_results_store, hash_dict_to_string, new_trade_run_data
+from backtest_engine import BacktestEngine, build_entry_index, find_entry_positions
+from shared_dataset import SharedDataset, attach_dataset
+from retrieve_binance.retrieve_news import load_news_cache
+
+# Runs the news backtester over symbols x EMA spans x exit thresholds on a
+# process pool. Each symbol is retrieved once, by a worker, which shares its
+# columns with the other workers, see shared_dataset.py. Up to a symbol per
+# process is retrieved ahead of the backtests, so workers build datasets
+# while others run backtests. The parent writes the runs to the results store
+# as they come in, and symbols that already have a run are skipped, so a
+# stopped sweep carries on where it left off.
+
+ENTRY_VARIABLES = {
+    "time_from_news_signal": 10,
+    "sum_asset_sold_zscore": 90,
+}
+
+# Columns shared for each symbol, the EMA columns once per span as {column}_{span}, see sweep_config
+SHARED_COLUMNS = [
+    "avg_price",
+    "sum_asset_bought",
+    "num_of_trades_bought",
+    "sum_asset_sold",
+    "num_of_trades_sold",
+    "sum_asset_bought_zscore",
+    "num_of_trades_bought_zscore",
+    "sum_asset_sold_zscore",
+    "num_of_trades_sold_zscore",
+    "news_signal",
+]
+SHARED_EMA_COLUMNS = [
+    "num_of_trades_bought_ema",
+    "num_of_trades_sold_ema",
+]
+
+
+def sweep_signal_variables(num_trade_ema_span, buy_sold_ratio, entry_variables=ENTRY_VARIABLES):
+    return {
+        "entry": dict(entry_variables),
+        "exit": {
+            "buy_sold_ratio": buy_sold_ratio,
+        },
+        "features": {
+            "num_trade_ema_span": num_trade_ema_span,
+        }
+    }
+
+
+def publish_symbol(symbol, date, num_trade_ema_spans, warm_up=None):
+    symbol_dataset = retrieve_sweep_dataset(symbol, date, num_trade_ema_spans, warm_up)
+    if symbol_dataset is None:
+        return None
+
+    # A month that started cold would be stored under the warmed up results key
+    if warm_up is not None and symbol_dataset.attrs.get("warm_up") is None:
+        print(f"> {symbol} on {date} has no month before to warm up from")
+        return None
+
+    columns = {"timestamp": symbol_dataset.index.asi8}
+    # Lets workers find the entry signals without going over the month
+    columns.update(build_entry_index(symbol_dataset["news_signal"], symbol_dataset["sum_asset_sold_zscore"]))
+    for column in SHARED_COLUMNS:
+        columns[column] = symbol_dataset[column].to_numpy()
+    for num_trade_ema_span in num_trade_ema_spans:
+        for column in SHARED_EMA_COLUMNS:
+            columns[f"{column}_{num_trade_ema_span}"] = symbol_dataset[f"{column}_{num_trade_ema_span}"].to_numpy()
+
+    return SharedDataset(symbol, columns)
+
+
+def run_backtest(task):
+    # Runs every exit threshold of one symbol and EMA span in one pass
+    symbol, date, signal_variables_list, dataset_path = task
+    columns = attach_dataset(dataset_path)
+
+    num_trade_ema_span = signal_variables_list[0]["features"]["num_trade_ema_span"]
+    entry_variables = signal_variables_list[0]["entry"]
+
+    engine = BacktestEngine({
+        "timestamp": columns["timestamp"],
+        "avg_price": columns["avg_price"],
+        "num_of_trades_bought_ema": columns[f"num_of_trades_bought_ema_{num_trade_ema_span}"],
+        "num_of_trades_sold_ema": columns[f"num_of_trades_sold_ema_{num_trade_ema_span}"],
+        "news_signal": columns["news_signal"],
+        "entry_positions": find_entry_positions(
+            columns,
+            columns["sum_asset_sold_zscore"],
+            entry_variables["time_from_news_signal"],
+            entry_variables["sum_asset_sold_zscore"],
+        ),
+    })
+
+    trade_run_datas = [new_trade_run_data(symbol, date, signal_variables) for signal_variables in signal_variables_list]
+    engine.run_thresholds(
+        [signal_variables["exit"]["buy_sold_ratio"] for signal_variables in signal_variables_list],
+        trade_run_datas
+    )
+
+    return symbol, trade_run_datas
+
+
+def run_sweep(symbols, date, num_trade_ema_spans, buy_sold_ratios, entry_variables=ENTRY_VARIABLES, processes=None, results_store=None, warm_up=None):
+    # date is a month or a list of months. Returns the overall results of each
+    # parameter set by its parameter_key, by month as well for a list of months.
+    # warm_up carries the features over from the month before, see RetriveDataset.
+    if results_store is None:
+        results_store = sweep_results_store(warm_up)
+
+    dates = [date] if isinstance(date, str) else list(date)
+    sweep_variables = {}
+    symbol_tasks = {}
+
+    for sweep_date in dates:
+        for symbol in symbols:
+            for num_trade_ema_span in num_trade_ema_spans:
+                for buy_sold_ratio in buy_sold_ratios:
+                    signal_variables = sweep_signal_variables(num_trade_ema_span, buy_sold_ratio, entry_variables)
+                    sweep_variables[results_store.parameter_key(signal_variables)] = signal_variables
+
+                    if results_store.has_run(sweep_date, signal_variables, symbol):
+                        continue
+
+                    # Exit thresholds of the same symbol, month and span are one task
+                    span_tasks = symbol_tasks.setdefault((sweep_date, symbol), {})
+                    span_tasks.setdefault(num_trade_ema_span, (symbol, sweep_date, []))[2].append(signal_variables)
+
+    num_backtests = sum(len(task[2]) for span_tasks in symbol_tasks.values() for task in span_tasks.values())
+    print(f"> Running {num_backtests} backtests for {len(symbol_tasks)} symbols and months")
+
+    # Symbols retrieved ahead, each published dataset stays on disk until its backtests are in
+    num_prefetch = processes or os.cpu_count() or 1
+
+    def collect(shared_dataset, results):
+        for symbol, trade_run_datas in results:
+            # Every threshold of the task in one transaction
+            results_store.add_runs(trade_run_datas)
+
+            for trade_run_data in trade_run_datas:
+                print(f"> Finished {symbol} for {hash_dict_to_string(trade_run_data['signal_variables'])}")
+
+        shared_dataset.unlink()
+
+    # Loaded before the workers fork so they share it, see news_store.get_news_cache
+    if len(symbol_tasks) > 0:
+        load_news_cache()
+
+    shared_datasets = []
+    publishing = deque()
+
+    try:
+        with multiprocessing.Pool(processes) as pool:
+            pending_symbols = iter(symbol_tasks.items())
+
+            def publish_next():
+                symbol_task = next(pending_symbols, None)
+                if symbol_task is not None:
+                    (sweep_date, symbol), _ = symbol_task
+                    publishing.append((symbol_task, pool.apply_async(publish_symbol, (symbol, sweep_date, num_trade_ema_spans, warm_up))))
+
+            for _ in range(num_prefetch):
+                publish_next()
+
+            running = deque()
+            while len(publishing) > 0:
+                ((sweep_date, symbol), span_tasks), published = publishing[0]
+                shared_dataset = published.get()
+                publishing.popleft()
+                publish_next()
+
+                if shared_dataset is None:
+                    print(f"> No data for {symbol} on {sweep_date}")
+                    continue
+                shared_datasets.append(shared_dataset)
+
+                results = pool.imap_unordered(run_backtest, [task + (shared_dataset.path,) for task in span_tasks.values()])
+                running.append((shared_dataset, results))
+
+                # The oldest symbol's backtests are collected while newer ones are retrieved
+                while len(running) > num_prefetch:
+                    collect(*running.popleft())
+
+            while len(running) > 0:
+                collect(*running.popleft())
+    finally:
+        # Also cleans up after a failed or interrupted sweep, including datasets
+        # published but not yet backtested
+        for _, published in publishing:
+            if published.ready() and published.successful() and published.get() is not None:
+                shared_datasets.append(published.get())
+
+        for shared_dataset in shared_datasets:
+            shared_dataset.unlink()
+
+    sweep_results = {
+        sweep_date: {
+            key: results_store.overall_results(sweep_date, signal_variables)
+            for key, signal_variables in sweep_variables.items()
+        }
+        for sweep_date in dates
+    }
+
+    return sweep_results[date] if isinstance(date, str) else sweep_results
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# retrieve_binance needs LOCAL_LOCATION set on import
+os.environ.setdefault("LOCAL_LOCATION", tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "binance_downloader"))
+
+EMA_COLUMNS = ["num_of_trades_bought_ema", "num_of_trades_sold_ema"]
+
+
+def synthetic_dataset(symbol, num_trade_ema_spans, num_rows=50000):
+    # Trading dataset of a month with news every ~100 seconds, the EMA columns
+    # once per span as {column}_{span} like backtester_data.sweep_config
+    rng = np.random.default_rng(sum(map(ord, symbol)))
+    index = pd.date_range("2023-09-01", periods=num_rows, freq="1s")
+
+    dataset = pd.DataFrame({
+        "avg_price": np.round(10 + np.cumsum(rng.normal(0, 0.002, num_rows)), 6),
+        "sum_asset_bought": np.round(rng.exponential(3, num_rows), 2),
+        "num_of_trades_bought": np.round(rng.exponential(3, num_rows), 2),
+        "sum_asset_sold": np.round(rng.exponential(3, num_rows), 2),
+        "num_of_trades_sold": np.round(rng.exponential(3, num_rows), 2),
+        "sum_asset_bought_zscore": np.round(rng.normal(0, 40, num_rows), 2),
+        "num_of_trades_bought_zscore": np.round(rng.normal(0, 40, num_rows), 2),
+        "sum_asset_sold_zscore": np.round(rng.normal(0, 40, num_rows), 2),
+        "num_of_trades_sold_zscore": np.round(rng.normal(0, 40, num_rows), 2),
+        "news_signal": (rng.random(num_rows) < 0.01).astype(np.int64),
+    }, index=index)
+
+    for num_trade_ema_span in num_trade_ema_spans:
+        span_rng = np.random.default_rng(num_trade_ema_span)
+        for column in EMA_COLUMNS:
+            dataset[f"{column}_{num_trade_ema_span}"] = np.round(rng.exponential(3, num_rows) * span_rng.random(num_rows), 2)
+
+    return dataset
+
+
+@pytest.fixture
+def make_dataset():
+    return synthetic_dataset
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_engine import BacktestEngine, build_entry_index, find_entry_positions
+from backtester_data import BacktesterData, new_trade_run_data
+
+# The array engine against BacktesterData's row by row backtest, and the
+# entry index against add_entry_signal
+
+EXIT_THRESHOLDS = [0.3, 1, 1.3, 3, 50, 1e9]
+
+
+def backtest_dataset(seed, num_rows=12000):
+    # Seconds with some missing, so the windows are found by time, and EMAs
+    # that are sometimes 0 or NaN so the ratio falls back to 1
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2023-09-01", periods=num_rows, freq="1s")
+    index = index[np.sort(rng.choice(num_rows, int(num_rows * 0.9), replace=False))]
+    num_rows = len(index)
+
+    num_bought_ema = np.round(rng.exponential(3, num_rows) * (rng.random(num_rows) < 0.7), 2)
+    num_sold_ema = np.round(rng.exponential(3, num_rows) * (rng.random(num_rows) < 0.7), 2)
+    num_bought_ema[:5] = np.nan
+
+    return pd.DataFrame({
+        "avg_price": np.round(10 + np.cumsum(rng.normal(0, 0.002, num_rows)), 6),
+        "num_of_trades_bought_ema": num_bought_ema,
+        "num_of_trades_sold_ema": num_sold_ema,
+        "sum_of_trades_bought_ema": num_bought_ema,
+        "sum_of_trades_sold_ema": num_sold_ema,
+        "sum_asset_sold_zscore": np.round(rng.normal(0, 40, num_rows), 2),
+        "news_signal": (rng.random(num_rows) < 0.01).astype(np.int64),
+    }, index=index)
+
+
+def signal_variables(buy_sold_ratio, time_from_news_signal=10, sum_asset_sold_zscore=50):
+    return {
+        "entry": {"time_from_news_signal": time_from_news_signal, "sum_asset_sold_zscore": sum_asset_sold_zscore},
+        "exit": {"buy_sold_ratio": buy_sold_ratio},
+        "features": {"num_trade_ema_span": 5},
+    }
+
+
+def backtest_rows(dataset, buy_sold_ratio, last_trade_index=None):
+    backtester = BacktesterData("TESTUSDT", "2023-09", signal_variables(buy_sold_ratio), symbol_dataset=dataset.copy())
+    backtester.last_trade_index = last_trade_index
+    backtester.backtest_trades_rows()
+    return backtester
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("last_trade_index", [None, pd.Timestamp("2023-09-01 00:30:00")])
+def test_engine_matches_rows(seed, last_trade_index):
+    dataset = backtest_dataset(seed)
+    backtesters = [backtest_rows(dataset, threshold, last_trade_index) for threshold in EXIT_THRESHOLDS]
+    engine = BacktestEngine(backtesters[0].symbol_dataset)
+
+    assert len(backtesters[0].trade_run_data["trades"]) > 0
+
+    threshold_run_datas = [new_trade_run_data("TESTUSDT", "2023-09", signal_variables(threshold)) for threshold in EXIT_THRESHOLDS]
+    threshold_last_trades = engine.run_thresholds(EXIT_THRESHOLDS, threshold_run_datas, last_trade_index)
+
+    for threshold, backtester, threshold_run_data, threshold_last_trade in zip(EXIT_THRESHOLDS, backtesters, threshold_run_datas, threshold_last_trades):
+        trade_run_data = new_trade_run_data("TESTUSDT", "2023-09", signal_variables(threshold))
+        assert engine.run(threshold, trade_run_data, last_trade_index) == backtester.last_trade_index
+        assert trade_run_data == backtester.trade_run_data
+
+        assert threshold_last_trade == backtester.last_trade_index
+        assert threshold_run_data == backtester.trade_run_data
+
+        rules_run_data = new_trade_run_data("TESTUSDT", "2023-09", signal_variables(threshold))
+        assert engine.run_exit_rules([("bought_sold_ratio", threshold)], rules_run_data, last_trade_index) == backtester.last_trade_index
+        assert rules_run_data == backtester.trade_run_data
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("time_from_news_signal", [1, 10, 60])
+@pytest.mark.parametrize("sum_asset_sold_zscore", [-1e9, 0, 50, 110, 1e9])
+def test_entry_positions_match_entry_signal(seed, time_from_news_signal, sum_asset_sold_zscore):
+    dataset = backtest_dataset(seed)
+    dataset.iloc[np.random.default_rng(seed).random(len(dataset)) < 0.01, dataset.columns.get_loc("sum_asset_sold_zscore")] = np.nan
+
+    backtester = BacktesterData.__new__(BacktesterData)
+    backtester.signal_variables = signal_variables(1.3, time_from_news_signal, sum_asset_sold_zscore)
+    expected = np.flatnonzero(backtester.add_entry_signal(dataset.copy())["entry_signal"].to_numpy() == 1)
+
+    entry_index = build_entry_index(dataset["news_signal"], dataset["sum_asset_sold_zscore"])
+    entry_positions = find_entry_positions(entry_index, dataset["sum_asset_sold_zscore"].to_numpy(), time_from_news_signal, sum_asset_sold_zscore)
+
+    np.testing.assert_array_equal(entry_positions, expected)
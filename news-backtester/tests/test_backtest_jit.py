@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import backtest_jit
+
+# The numba compiled find_trades against its plain Python function
+
+numba = pytest.importorskip("numba")
+
+
+def trade_inputs(seed, num_rows=5000, num_signals=60):
+    rng = np.random.default_rng(seed)
+
+    timestamps = np.arange(num_rows, dtype=np.int64) * 1000
+    signal_positions = np.sort(rng.choice(num_rows - 1, num_signals, replace=False)).astype(np.int64)
+    window_ends = np.minimum(signal_positions + rng.integers(1, 600, num_signals), num_rows).astype(np.int64)
+
+    bought_sold_ratio = rng.lognormal(0, 0.5, num_rows)
+    bought_ema = rng.random(num_rows)
+    sold_ema = rng.random(num_rows)
+
+    return timestamps, signal_positions, window_ends, bought_sold_ratio, bought_ema, sold_ema
+
+
+@pytest.mark.parametrize("exit_rules", [
+    [("bought_sold_ratio", 2.5)],
+    [("ema_delta", 30)],
+    [("time_max", 120)],
+    [("bought_sold_ratio", 3), ("ema_delta", 60), ("time_max", 300)],
+    [("bought_sold_ratio", 1e9)],
+])
+@pytest.mark.parametrize("lockout,has_last_trade,last_trade_time", [
+    (0, False, 0),
+    (60 * 1000, False, 0),
+    (120 * 1000, True, 500 * 1000),
+])
+def test_numba_matches_python(exit_rules, lockout, has_last_trade, last_trade_time):
+    assert isinstance(backtest_jit.find_trades, numba.core.registry.CPUDispatcher)
+
+    rule_ids, rule_parameters = backtest_jit.exit_rule_arrays(exit_rules)
+
+    for seed in range(3):
+        arguments = trade_inputs(seed) + (rule_ids, rule_parameters, lockout, has_last_trade, last_trade_time)
+
+        entry_positions, exit_positions = backtest_jit.find_trades(*arguments)
+        python_entry_positions, python_exit_positions = backtest_jit.find_trades.py_func(*arguments)
+
+        assert len(entry_positions) > 0
+        np.testing.assert_array_equal(entry_positions, python_entry_positions)
+        np.testing.assert_array_equal(exit_positions, python_exit_positions)
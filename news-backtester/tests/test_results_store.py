@@ -0,0 +1,77 @@
+import pytest
+
+from backtester_data import new_trade_run_data
+from results_store import ResultsStore
+
+# Overall results of parameter sets, added up over their runs by the store
+
+SIGNAL_VARIABLES = {"entry": {"sum_asset_sold_zscore": 90}, "exit": {"buy_sold_ratio": 1}, "features": {"num_trade_ema_span": 2}}
+OTHER_SIGNAL_VARIABLES = {"entry": {"sum_asset_sold_zscore": 90}, "exit": {"buy_sold_ratio": 2}, "features": {"num_trade_ema_span": 2}}
+
+
+def trade_run_data(symbol, date, signal_variables, gain_loss_percentages):
+    trade_run_data = new_trade_run_data(symbol, date, signal_variables)
+    trade_run_data["total_trades"] = len(gain_loss_percentages)
+    trade_run_data["winning_trades"] = sum(1 for gain_loss in gain_loss_percentages if gain_loss > 0)
+    trade_run_data["losing_trades"] = sum(1 for gain_loss in gain_loss_percentages if gain_loss <= 0)
+    trade_run_data["total_gain_loss_percentage"] = sum(gain_loss_percentages)
+    if len(gain_loss_percentages) > 0:
+        trade_run_data["average_gain_loss_percentage"] = sum(gain_loss_percentages) / len(gain_loss_percentages)
+    return trade_run_data
+
+
+@pytest.fixture
+def results_store(tmp_path):
+    results_store = ResultsStore(str(tmp_path / "results.db"))
+    # Averages 0.1 over 4 trades, and 0.5 over one, 0.18 over all 5 trades
+    results_store.add_runs([
+        trade_run_data("AAAUSDT", "2023-09", SIGNAL_VARIABLES, [0.2, 0.2, 0.2, -0.2]),
+        trade_run_data("BBBUSDT", "2023-09", SIGNAL_VARIABLES, [0.5]),
+        trade_run_data("CCCUSDT", "2023-09", SIGNAL_VARIABLES, []),
+        trade_run_data("AAAUSDT", "2023-09", OTHER_SIGNAL_VARIABLES, []),
+        trade_run_data("AAAUSDT", "2023-10", SIGNAL_VARIABLES, [0.3, -0.1]),
+    ])
+    yield results_store
+    results_store.close()
+
+
+def test_overall_results_average_over_trades(results_store):
+    overall_results = results_store.overall_results("2023-09", SIGNAL_VARIABLES)
+
+    assert overall_results["total_trades"] == 5
+    assert isinstance(overall_results["total_trades"], int)
+    assert overall_results["winning_trades"] == 4
+    assert overall_results["losing_trades"] == 1
+    assert overall_results["total_gain_loss_percentage"] == pytest.approx(0.9)
+    assert overall_results["average_gain_loss_percentage"] == pytest.approx(0.18)
+    assert overall_results["symbols_contributing"] == ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+
+
+def test_overall_results_without_trades(results_store):
+    overall_results = results_store.overall_results("2023-09", OTHER_SIGNAL_VARIABLES)
+
+    assert overall_results["total_trades"] == 0
+    assert overall_results["average_gain_loss_percentage"] == 0
+
+    assert results_store.overall_results("2023-08", SIGNAL_VARIABLES)["average_gain_loss_percentage"] == 0
+
+
+def test_top_parameter_sets_average_over_trades(results_store):
+    top_parameter_sets = results_store.top_parameter_sets(date="2023-09", n=2)
+
+    assert [parameter_set["signal_variables"] for parameter_set in top_parameter_sets] == [SIGNAL_VARIABLES, OTHER_SIGNAL_VARIABLES]
+    assert top_parameter_sets[0]["num_symbols"] == 3
+    assert top_parameter_sets[0]["total_trades"] == 5
+    assert top_parameter_sets[0]["average_gain_loss_percentage"] == pytest.approx(0.18)
+    assert top_parameter_sets[1]["average_gain_loss_percentage"] == 0
+
+
+def test_top_parameter_sets_over_months(results_store):
+    # Only SIGNAL_VARIABLES was run in both months, 1.1 over 7 trades
+    top_parameter_sets = results_store.top_parameter_sets(dates=["2023-09", "2023-10"], order_by="average_gain_loss_percentage")
+
+    assert len(top_parameter_sets) == 1
+    assert top_parameter_sets[0]["num_months"] == 2
+    assert top_parameter_sets[0]["total_trades"] == 7
+    assert top_parameter_sets[0]["total_gain_loss_percentage"] == pytest.approx(1.1)
+    assert top_parameter_sets[0]["average_gain_loss_percentage"] == pytest.approx(1.1 / 7)
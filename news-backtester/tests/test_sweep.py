@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import backtester_data
+import shared_dataset
+import sweep
+from results_store import ResultsStore
+
+# run_sweep on a process pool against synthetic datasets, workers retrieve
+# and publish the symbols
+
+SYMBOLS = ["AAAUSDT", "BBBUSDT", "NODATAUSDT", "CCCUSDT", "DDDUSDT"]
+NUM_TRADE_EMA_SPANS = [2, 5]
+BUY_SOLD_RATIOS = [0.5, 1, 1.5]
+
+
+@pytest.fixture
+def synthetic_sweep(monkeypatch, tmp_path, make_dataset):
+    def retrieve_sweep_dataset(symbol, date, num_trade_ema_spans, warm_up=None):
+        if symbol == "NODATAUSDT":
+            return None
+        return make_dataset(symbol, num_trade_ema_spans)
+
+    # Workers are forked, so they see the patches
+    monkeypatch.setattr(sweep, "retrieve_sweep_dataset", retrieve_sweep_dataset)
+    monkeypatch.setattr(sweep, "load_news_cache", lambda: None)
+    monkeypatch.setattr(shared_dataset, "SHARED_DATASET_LOCATION", str(tmp_path / "shared"))
+    os.makedirs(tmp_path / "shared")
+
+    def run(name, processes):
+        results_store = ResultsStore(str(tmp_path / f"{name}.db"), feature_config=backtester_data.CONFIG["features"])
+        sweep_results = sweep.run_sweep(SYMBOLS, "2023-09", NUM_TRADE_EMA_SPANS, BUY_SOLD_RATIOS, processes=processes, results_store=results_store)
+        return results_store, sweep_results
+
+    return run
+
+
+def stored_trades(results_store, signal_variables):
+    # Runs are stored in the order they finish, so their ids differ between sweeps
+    return [
+        {column: value for column, value in trade.items() if column != "run_id"}
+        for trade in results_store.trades("2023-09", signal_variables)
+    ]
+
+
+def test_parallel_sweep_matches_serial(synthetic_sweep, tmp_path):
+    parallel_store, parallel_results = synthetic_sweep("parallel", processes=3)
+    serial_store, serial_results = synthetic_sweep("serial", processes=1)
+
+    assert len(parallel_results) == len(NUM_TRADE_EMA_SPANS) * len(BUY_SOLD_RATIOS)
+    assert parallel_results == serial_results
+
+    for overall_results in parallel_results.values():
+        assert overall_results["symbols_contributing"] == ["AAAUSDT", "BBBUSDT", "CCCUSDT", "DDDUSDT"]
+        assert overall_results["total_trades"] > 0
+
+    for num_trade_ema_span in NUM_TRADE_EMA_SPANS:
+        signal_variables = sweep.sweep_signal_variables(num_trade_ema_span, 1)
+        assert stored_trades(parallel_store, signal_variables) == stored_trades(serial_store, signal_variables)
+
+    # Every published dataset is removed
+    assert os.listdir(tmp_path / "shared") == []
+
+
+def test_resumed_sweep_skips_runs(synthetic_sweep, capsys):
+    synthetic_sweep("resumed", processes=2)
+    capsys.readouterr()
+
+    synthetic_sweep("resumed", processes=2)
+
+    # Only the symbol without data is tried again
+    assert "> Running 6 backtests for 1 symbols and months" in capsys.readouterr().out
@@ -0,0 +1,52 @@
+from retrieve_binance.multi_month import MONTH_WARM_UP, month_range, walk_forward_splits
+from backtester_data import sweep_results_store
+from results_store import hash_dict_to_string
+from sweep import ENTRY_VARIABLES, run_sweep
+
+# Walk-forward backtest over a range of months. Every month is swept once,
+# with features warmed up from the month before, then for each rolling split
+# the best parameter set over the train months is scored on the test months
+# that follow. Months already in the results store aren't run again.
+
+
+def walk_forward_results_store():
+    return sweep_results_store(MONTH_WARM_UP)
+
+
+def run_walk_forward(symbols, start_date, end_date, num_trade_ema_spans, buy_sold_ratios, train_months=3, test_months=1,
+                     order_by="total_gain_loss_percentage", entry_variables=ENTRY_VARIABLES, processes=None, results_store=None):
+    # Returns the train and test months of each split, the parameter set picked
+    # on the train months and its overall results in each test month
+    if results_store is None:
+        results_store = walk_forward_results_store()
+
+    dates = month_range(start_date, end_date)
+    splits = walk_forward_splits(dates, train_months, test_months)
+    if len(splits) == 0:
+        raise Exception(f"{len(dates)} months from {start_date} to {end_date} is too few for {train_months} train and {test_months} test months")
+
+    run_sweep(symbols, dates, num_trade_ema_spans, buy_sold_ratios, entry_variables, processes, results_store, warm_up=MONTH_WARM_UP)
+
+    walk_forward_results = []
+    for train_dates, test_dates in splits:
+        top_parameter_sets = results_store.top_parameter_sets(n=1, order_by=order_by, dates=train_dates)
+        if len(top_parameter_sets) == 0:
+            print(f"> No parameter set run in all of {train_dates[0]} to {train_dates[-1]}")
+            continue
+
+        signal_variables = top_parameter_sets[0]["signal_variables"]
+        test_results = {date: results_store.overall_results(date, signal_variables) for date in test_dates}
+
+        print(f"> Trained {train_dates[0]} to {train_dates[-1]}: {hash_dict_to_string(signal_variables)} {round(top_parameter_sets[0][order_by], 4)}")
+        for date, overall_results in test_results.items():
+            print(f"> Tested {date}: {overall_results[order_by]}")
+
+        walk_forward_results.append({
+            "train_dates": train_dates,
+            "test_dates": test_dates,
+            "signal_variables": signal_variables,
+            "train_results": top_parameter_sets[0],
+            "test_results": test_results,
+        })
+
+    return walk_forward_results